@@ -1,715 +1,97 @@
+import time
+
+# Referencia para reportar el tiempo de importación de la app
+IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask, request, jsonify, render_template, send_file
 import requests
-from bs4 import BeautifulSoup
-from PIL import Image, ImageDraw, ImageFont
 import io
 import os
 import re
 import urllib.parse
-import math
 import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from core import (
+    FONT_PATHS, StockCatalog, StockMatrix, default_font, image_gen, load_font,
+    scheduler, scraper, store
+)
 
 app = Flask(__name__)
 
+# Segundos que un pedido web puede pasar esperando a la tienda; gunicorn.conf.py
+# lo ajusta al timeout de los workers
+app.config.setdefault('REQUEST_BUDGET_SECONDS', 25)
 
-class PaulinaScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+collage_renderer = None
 
-    def scrape_product(self, url):
-        try:
-            print(f"🔍 Scraping URL: {url}")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            product_data = {
-                'name': self.extract_name(soup),
-                'price': self.extract_price(soup),
-                'image_url': self.extract_image(soup, url),
-                'sizes_colors': self.extract_sizes_and_colors(soup),
-                'original_url': url
-            }
-
-            print(f"✅ Datos extraídos: {product_data}")
-            return product_data
-
-        except Exception as e:
-            print(f"❌ Error en scraping: {e}")
-            return {'error': str(e)}
-
-    def extract_name(self, soup):
-        """Extraer nombre del producto"""
-        # Buscar en el formulario donde está la descripción
-        desc_input = soup.find('input', {'name': 'descripcion'})
-        if desc_input and desc_input.get('value'):
-            name = desc_input['value'].strip()
-            if name:
-                print(f"✅ Nombre desde input descripcion: {name}")
-                return name
-
-        # Buscar en elementos de texto
-        selectors = [
-            'h3', 'h1', '.product-title', '.product-name'
-        ]
-
-        for selector in selectors:
-            try:
-                element = soup.select_one(selector)
-                if element and element.text.strip():
-                    name = element.text.strip()
-                    print(f"✅ Nombre encontrado con selector '{selector}': {name}")
-                    return name
-            except Exception as e:
-                continue
-
-        return "Producto Paulina Mayorista"
-
-    def extract_price(self, soup):
-        """Extraer precio del producto"""
-        # Buscar en el input hidden del precio
-        price_input = soup.find('input', {'name': 'precio'})
-        if price_input and price_input.get('value'):
-            try:
-                price = float(price_input['value'])
-                print(f"✅ Precio desde input: {price}")
-                return price
-            except ValueError:
-                pass
-
-        # Buscar en texto de la página
-        price_selectors = [
-            '.title strong',
-            'p.title strong',
-            '.precio',
-            '.price'
-        ]
-
-        for selector in price_selectors:
-            try:
-                elements = soup.select(selector)
-                for element in elements:
-                    price_text = element.text.strip()
-                    matches = re.findall(r'\$?\s*(\d+[.,]\d+)', price_text)
-                    if matches:
-                        price_str = matches[0].replace(',', '.')
-                        price = float(price_str)
-                        print(f"✅ Precio desde texto: {price}")
-                        return price
-            except Exception as e:
-                continue
-
-        return 0.0
-
-    def extract_image(self, soup, base_url):
-        """Extraer imagen PRINCIPAL del producto - VERSIÓN CORREGIDA"""
-        print("🖼️ Buscando imagen PRINCIPAL del producto...")
-
-        # ESTRATEGIA 1: Buscar en la galería (donde están las imágenes del producto)
-        gallery_selectors = [
-            '.tz-gallery .col-sm-12.col-md-12 img.img-responsive',  # Imagen principal en galería
-            '.tz-gallery img.img-responsive',  # Cualquier imagen responsive en galería
-            '.tz-gallery img',  # Cualquier imagen en galería
-            'a.lightbox img'  # Imágenes que abren lightbox
-        ]
-
-        for selector in gallery_selectors:
-            try:
-                img_elements = soup.select(selector)
-                print(f"  Buscando con selector: {selector} - Encontradas: {len(img_elements)}")
-
-                for img in img_elements:
-                    img_src = img.get('src', '').strip()
-                    if img_src:
-                        full_url = self.make_absolute_url(img_src, base_url)
-                        print(f"✅✅✅ IMAGEN PRINCIPAL ENCONTRADA: {full_url}")
-                        return full_url
-            except Exception as e:
-                print(f"Error con selector {selector}: {e}")
-                continue
-
-        # ESTRATEGIA 2: Buscar imágenes específicas en uploads/products/
-        all_images = soup.find_all('img')
-        print(f"📸 Total de imágenes en página: {len(all_images)}")
-
-        for i, img in enumerate(all_images):
-            img_src = img.get('src', '')
-            if img_src:
-                print(f"  Imagen {i + 1}: {img_src}")
-
-                # Filtrar solo imágenes de productos
-                if 'uploads/products/' in img_src:
-                    # Excluir thumbnails
-                    if not any(thumb in img_src.lower() for thumb in ['thumb', 'small', 'mini']):
-                        full_url = self.make_absolute_url(img_src, base_url)
-                        print(f"✅ Imagen de producto encontrada: {full_url}")
-                        return full_url
-
-        print("❌ No se pudo encontrar la imagen del producto")
-        return None
-
-    def extract_sizes_and_colors(self, soup):
-        """Extraer talles y colores disponibles - VERSIÓN CORREGIDA"""
-        print("🎨 Extrayendo talles y colores...")
-
-        sizes_colors_data = {
-            'sizes': [],
-            'colors': [],
-            'availability': {}
-        }
-
-        try:
-            table = soup.find('table')
-            if not table:
-                return sizes_colors_data
-
-            # 1. TALLES - Buscar th en thead
-            thead = table.find('thead')
-            if thead:
-                th_elements = thead.find_all('th')[1:]  # Saltar primer th vacío
-                for th in th_elements:
-                    size = th.get_text(strip=True)
-                    if size:
-                        sizes_colors_data['sizes'].append(size)
-
-            # Si no hay talles, usar UNICO
-            if not sizes_colors_data['sizes']:
-                sizes_colors_data['sizes'] = ['UNICO']
-
-            # 2. COLORES - Buscar TODOS los spans en tbody
-            tbody = table.find('tbody')
-            if tbody:
-                # Buscar TODOS los spans en el tbody (cada fila tiene uno)
-                color_spans = tbody.find_all('span')
-                print(f"🎨 Se encontraron {len(color_spans)} spans de colores")
-
-                for span in color_spans:
-                    color_name = span.get_text(strip=True)
-                    if color_name and color_name not in sizes_colors_data['colors']:
-                        sizes_colors_data['colors'].append(color_name)
-                        sizes_colors_data['availability'][color_name] = {}
-
-                        # Marcar disponibilidad para todos los talles
-                        for size in sizes_colors_data['sizes']:
-                            sizes_colors_data['availability'][color_name][size] = True
-
-            print(f"✅ RESULTADO: {len(sizes_colors_data['colors'])} colores → {sizes_colors_data['colors']}")
-            print(f"✅ RESULTADO: {len(sizes_colors_data['sizes'])} talles → {sizes_colors_data['sizes']}")
-
-        except Exception as e:
-            print(f"❌ Error: {e}")
-
-        return sizes_colors_data
-
-    def make_absolute_url(self, img_src, base_url):
-        """Convertir URL relativa a absoluta"""
-        if img_src.startswith('//'):
-            return 'https:' + img_src
-        elif img_src.startswith('/'):
-            parsed_url = urllib.parse.urlparse(base_url)
-            return f"{parsed_url.scheme}://{parsed_url.netloc}{img_src}"
-        elif img_src.startswith('http'):
-            return img_src
-        else:
-            # Para URLs relativas como "uploads/products/LC7326.Ijpg.jpg"
-            parsed_url = urllib.parse.urlparse(base_url)
-            base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-
-            if img_src.startswith('/'):
-                return f"{base_domain}{img_src}"
-            else:
-                return f"{base_domain}/{img_src}"
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+first_request_done = False
 
 
-class ImageGenerator:
-    def generate_product_image(self, product_data, price_formula="x * 1.55"):
-        try:
-            print(f"🎨 Generando imagen para: {product_data['name']}")
+def get_collage_renderer():
+    """El renderer de collages (y su módulo) se carga recién cuando se usa"""
+    global collage_renderer
+    if collage_renderer is None:
+        from collage import CollageRenderer
 
-            # Crear imagen del producto
-            product_image = self.get_product_image(product_data['image_url'])
+        collage_renderer = CollageRenderer(scraper, image_gen, scheduler)
+    return collage_renderer
 
-            # Obtener dimensiones de la imagen original
-            original_width, original_height = product_image.size
-            print(f"📐 Dimensiones originales: {original_width}x{original_height}")
 
-            # Calcular dimensiones del canvas final (más alto para la tabla)
-            canvas_width, canvas_height, product_size, product_position = self.calculate_layout(
-                original_width, original_height, product_data.get('sizes_colors')
-            )
-
-            # Crear imagen final con dimensiones dinámicas
-            final_image = Image.new('RGB', (canvas_width, canvas_height), color='white')
-            draw = ImageDraw.Draw(final_image)
-
-            # Dibujar tabla de talles y colores si existe
-            table_height = self.draw_sizes_colors_table(
-                draw, product_data.get('sizes_colors', {}),
-                canvas_width, canvas_height
-            )
+def warmup():
+    """Precalentar el proceso: con preload_app se ejecuta en el master antes del fork,
+    así fuentes, módulos y código ya ejecutado quedan compartidos (copy-on-write)."""
+    started = time.perf_counter()
+
+    # Módulos de carga diferida
+    import sqlite3  # noqa: F401
+    import ssl
+    get_collage_renderer()
+
+    # Fuentes en los tamaños que se usan al renderizar
+    for size in (24, 28, 32, 36, 52, 14):
+        load_font(size, FONT_PATHS)
+    for size in (12, 14, 20):
+        load_font(size)
+    default_font()
+
+    # Pool HTTP y OpenSSL inicializados (sin abrir conexiones: no se comparten sockets entre workers)
+    scraper.session.get_adapter('https://')
+    ssl.create_default_context(cafile=requests.certs.where())
+
+    # Parseo y render descartables de una tarjeta placeholder
+    sample_html = (
+        '<input name="descripcion" value="Producto de ejemplo"><input name="precio" value="1000">'
+        '<table><thead><tr><th></th><th>M</th></tr></thead>'
+        '<tbody><tr><td><span>Negro</span></td><td><input name="cantidad"></td></tr></tbody></table>'
+    )
+    sample = scraper.parse_html(sample_html, 'http://localhost/producto/warmup')
+    card = image_gen.generate_product_image(sample)
+    if card:
+        card.save(io.BytesIO(), 'JPEG', quality=95)
+
+    print(f"🔥 Warmup listo en {(time.perf_counter() - started) * 1000:.0f}ms "
+          f"(importación de la app: {IMPORT_SECONDS * 1000:.0f}ms)")
 
-            # Ajustar posición del producto para dejar espacio para la tabla
-            adjusted_product_position = (product_position[0], product_position[1] + table_height)
-
-            # Redimensionar y pegar imagen del producto manteniendo relación de aspecto
-            resized_product = self.resize_product_image(product_image, product_size)
-            final_image.paste(resized_product, adjusted_product_position)
-
-            # Configurar fuentes
-            title_font, price_font, table_font = self.load_fonts(canvas_width, product_data['name'])
-
-            # Calcular precio
-            original_price = product_data['price']
-            modified_price = self.calculate_price(original_price, price_formula)
-
-            print(f"💰 Precio original: {original_price}, Precio modificado: {modified_price}")
-
-            # Dibujar textos en posiciones dinámicas
-            self.draw_texts(draw, product_data['name'], modified_price, title_font, price_font,
-                            canvas_width, canvas_height, adjusted_product_position, product_size)
-
-            # Devolver imagen en memoria (sin guardar)
-            return final_image
-
-        except Exception as e:
-            print(f"❌ Error generando imagen: {e}")
-            return None
-
-    def draw_sizes_colors_table(self, draw, sizes_colors_data, canvas_width, canvas_height):
-        """Dibujar tabla de talles y colores en la parte superior"""
-        if not sizes_colors_data or not sizes_colors_data.get('sizes') or not sizes_colors_data.get('colors'):
-            print("ℹ️ No hay datos de talles/colores para mostrar")
-            return 0
-
-        try:
-            sizes = sizes_colors_data['sizes']
-            colors = sizes_colors_data['colors']
-            availability = sizes_colors_data.get('availability', {})
-
-            print(f"📊 Dibujando tabla: {len(colors)} colores x {len(sizes)} talles")
-
-            # Configuración de la tabla
-            table_top = 20
-            row_height = 30
-            col_width = 80
-            color_col_width = 150
-
-            # Calcular ancho total de la tabla
-            table_width = color_col_width + (len(sizes) * col_width)
-
-            # Centrar la tabla horizontalmente
-            table_left = (canvas_width - table_width) // 2
-
-            # Fuentes
-            try:
-                header_font = ImageFont.truetype("arial.ttf", 14)
-                cell_font = ImageFont.truetype("arial.ttf", 12)
-            except:
-                header_font = ImageFont.load_default()
-                cell_font = ImageFont.load_default()
-
-            # Dibujar fondo de la tabla
-            table_height = (len(colors) + 1) * row_height
-            draw.rectangle([table_left, table_top, table_left + table_width, table_top + table_height],
-                           fill='#f8f9fa', outline='#dee2e6')
-
-            # Dibujar encabezados de talles
-            for i, size in enumerate(sizes):
-                x = table_left + color_col_width + (i * col_width)
-                y = table_top
-
-                # Celda del encabezado
-                draw.rectangle([x, y, x + col_width, y + row_height], fill='#343a40', outline='#dee2e6')
-
-                # Texto del talle
-                draw.text((x + col_width / 2, y + row_height / 2), str(size),
-                          fill='white', font=header_font, anchor="mm")
-
-            # Dibujar encabezado de colores
-            draw.rectangle([table_left, table_top, table_left + color_col_width, table_top + row_height],
-                           fill='#343a40', outline='#dee2e6')
-            draw.text((table_left + color_col_width / 2, table_top + row_height / 2), "COLORES",
-                      fill='white', font=header_font, anchor="mm")
-
-            # Dibujar filas de colores
-            for row_idx, color in enumerate(colors):
-                y = table_top + (row_idx + 1) * row_height
-
-                # Celda del color
-                draw.rectangle([table_left, y, table_left + color_col_width, y + row_height],
-                               fill='#e9ecef', outline='#dee2e6')
-
-                # Texto del color (truncar si es muy largo)
-                color_display = color[:18] + "..." if len(color) > 18 else color
-                draw.text((table_left + 5, y + row_height / 2), color_display,
-                          fill='black', font=cell_font, anchor="lm")
-
-                # Celdas de disponibilidad por talle
-                for col_idx, size in enumerate(sizes):
-                    x = table_left + color_col_width + (col_idx * col_width)
-
-                    # Verificar disponibilidad
-                    is_available = availability.get(color, {}).get(size, False)
-                    cell_color = '#d4edda' if is_available else '#f8d7da'
-                    text_color = '#155724' if is_available else '#721c24'
-                    symbol = '✓' if is_available else '✗'
-
-                    draw.rectangle([x, y, x + col_width, y + row_height],
-                                   fill=cell_color, outline='#dee2e6')
-                    draw.text((x + col_width / 2, y + row_height / 2), symbol,
-                              fill=text_color, font=cell_font, anchor="mm")
-
-            print(f"✅ Tabla dibujada: {table_height}px de altura")
-            return table_height + 10  # Altura total + margen
-
-        except Exception as e:
-            print(f"❌ Error dibujando tabla: {e}")
-            return 0
-
-    def calculate_layout(self, img_width, img_height, sizes_colors_data=None):
-        """Calcular layout dinámico considerando la tabla"""
-        # Altura base adicional para la tabla
-        table_height = 0
-        if sizes_colors_data and sizes_colors_data.get('sizes') and sizes_colors_data.get('colors'):
-            num_rows = len(sizes_colors_data['colors']) + 1  # +1 para el encabezado
-            table_height = num_rows * 35 + 50  # Estimación de altura
-
-        # Determinar el tamaño del canvas
-        if img_width > 800 or img_height > 600:
-            canvas_width = max(800, img_width + 100)
-            canvas_height = max(600 + table_height, img_height + 200 + table_height)
-        elif img_width < 300 or img_height < 300:
-            canvas_width = 800
-            canvas_height = 600 + table_height
-        else:
-            canvas_width = img_width + 100
-            canvas_height = img_height + 200 + table_height
-
-        # Calcular tamaño y posición del producto
-        if img_width > canvas_width - 100 or img_height > canvas_height - 200 - table_height:
-            max_product_width = canvas_width - 100
-            max_product_height = canvas_height - 200 - table_height
-
-            ratio = min(max_product_width / img_width, max_product_height / img_height)
-            product_width = int(img_width * ratio)
-            product_height = int(img_height * ratio)
-        else:
-            product_width = min(img_width, canvas_width - 100)
-            product_height = min(img_height, canvas_height - 200 - table_height)
-
-        # Centrar la imagen horizontalmente
-        x_position = (canvas_width - product_width) // 2
-        y_position = 50  # Margen superior base (se ajustará con table_height)
-
-        print(f"📏 Canvas: {canvas_width}x{canvas_height}, Producto: {product_width}x{product_height}")
-        print(f"📍 Posición: ({x_position}, {y_position})")
-
-        return canvas_width, canvas_height, (product_width, product_height), (x_position, y_position)
-
-    def resize_product_image(self, image, target_size):
-        """Redimensionar imagen manteniendo relación de aspecto"""
-        width, height = target_size
-
-        # Mantener relación de aspecto
-        original_width, original_height = image.size
-        ratio = min(width / original_width, height / original_height)
-
-        new_width = int(original_width * ratio)
-        new_height = int(original_height * ratio)
-
-        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-    def get_product_image(self, image_url):
-        """Obtener imagen del producto"""
-        if image_url:
-            try:
-                print(f"📥 Descargando imagen: {image_url}")
-                response = requests.get(image_url, timeout=15)
-                response.raise_for_status()
-
-                # Verificar que sea una imagen
-                content_type = response.headers.get('content-type', '')
-                if 'image' not in content_type:
-                    print(f"❌ URL no es una imagen: {content_type}")
-                    return self.create_placeholder()
-
-                image = Image.open(io.BytesIO(response.content))
-                print(f"✅ Imagen descargada correctamente: {image.size}")
-                return image
-
-            except Exception as e:
-                print(f"❌ Error descargando imagen: {e}")
-
-        return self.create_placeholder()
-
-    def create_placeholder(self):
-        """Crear imagen placeholder de tamaño estándar"""
-        placeholder = Image.new('RGB', (400, 400), color='lightgray')
-        draw = ImageDraw.Draw(placeholder)
-
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-        except:
-            font = ImageFont.load_default()
-
-        draw.text((200, 200), "Imagen no disponible", fill='darkgray', font=font, anchor="mm")
-        return placeholder
-
-    def load_fonts(self, canvas_width, product_name):
-        """Cargar fuentes con título dinámico y precio fijo grande"""
-        try:
-            # TAMAÑO FIJO GRANDE para el precio (siempre igual)
-            price_font_size = 52
-            table_font_size = 14
-
-            # TAMAÑO DINÁMICO para el título (se ajusta según longitud)
-            name_length = len(product_name)
-
-            if name_length > 60:
-                title_font_size = 24  # Más pequeño para nombres muy largos
-            elif name_length > 40:
-                title_font_size = 28  # Mediano para nombres largos
-            elif name_length > 25:
-                title_font_size = 32  # Normal para nombres medianos
-            else:
-                title_font_size = 36  # Grande para nombres cortos
-
-            # Intentar cargar fuentes
-            font_loaded = False
-            font_path = None
-
-            # Lista de fuentes a probar
-            font_paths = [
-                "arial.ttf",
-                "DejaVuSans.ttf",
-                "LiberationSans-Regular.ttf"
-            ]
-
-            for fp in font_paths:
-                try:
-                    font = ImageFont.truetype(fp, title_font_size)
-                    font_loaded = True
-                    font_path = fp
-                    print(f"✅ Fuente cargada: {font_path}")
-                    break
-                except:
-                    continue
-
-            if font_loaded:
-                title_font = ImageFont.truetype(font_path, title_font_size)
-                price_font = ImageFont.truetype(font_path, price_font_size)
-                table_font = ImageFont.truetype(font_path, table_font_size)
-            else:
-                # Fuentes por defecto con ajustes de tamaño
-                print("⚠️  Usando fuentes por defecto")
-                title_font = ImageFont.load_default()
-                price_font = ImageFont.load_default()
-                table_font = ImageFont.load_default()
-                # Ajustar tamaños para fuentes por defecto
-                if name_length > 60:
-                    title_font_size = 30
-                elif name_length > 40:
-                    title_font_size = 35
-                elif name_length > 25:
-                    title_font_size = 40
-                else:
-                    title_font_size = 45
-                price_font_size = 65
-
-            print(f"🎯 Tamaños - Título: {title_font_size}px ({name_length} chars), Precio: {price_font_size}px")
-
-        except Exception as e:
-            print(f"❌ Error cargando fuentes: {e}")
-            title_font = ImageFont.load_default()
-            price_font = ImageFont.load_default()
-            table_font = ImageFont.load_default()
-
-        return title_font, price_font, table_font
-
-    def calculate_price(self, original_price, formula):
-        """Calcular precio con fórmula y redondeo inteligente"""
-        try:
-            expression = formula.replace('x', str(original_price))
-            result = eval(expression)
-            print(f"🧮 Fórmula aplicada: {formula} = {result}")
-
-            # Aplicar redondeo inteligente basado en el precio
-            result = self.smart_round_price(result, formula)
-
-            return result
-
-        except Exception as e:
-            print(f"❌ Error en fórmula, usando valor por defecto: {e}")
-            return self.smart_round_price(original_price * 1.55, "x * 1.55")
-
-    def smart_round_price(self, price, formula):
-        """
-        Redondeo inteligente basado en el precio y la fórmula
-        """
-        print(f"💰 Precio antes de redondeo: {price}")
-
-        # Detectar si es un recargo del 55%
-        is_55_percent = any(trigger in formula for trigger in ['1.55', '0.55', '55%'])
-
-        if is_55_percent:
-            # Para recargo del 55%, usar múltiplo de 500
-            multiple = 500
-            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
-            print(f"🎯 Recargo 55% detectado - Redondeando a múltiplo de {multiple}: {rounded_price}")
-
-        elif price > 50000:
-            # Precios altos: múltiplo de 1000
-            multiple = 1000
-            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
-            print(f"📈 Precio alto - Redondeando a múltiplo de {multiple}: {rounded_price}")
-
-        elif price > 10000:
-            # Precios medios: múltiplo de 500
-            multiple = 500
-            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
-            print(f"⚖️ Precio medio - Redondeando a múltiplo de {multiple}: {rounded_price}")
-
-        else:
-            # Precios bajos: múltiplo de 100
-            multiple = 100
-            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
-            print(f"📉 Precio bajo - Redondeando a múltiplo de {multiple}: {rounded_price}")
-
-        return rounded_price
-
-    def round_to_nearest(self, number, multiple=500, round_up=True):
-        """
-        Redondear un número al múltiplo más cercano
-        """
-        if multiple == 0:
-            return number
-
-        if round_up:
-            # Redondear siempre hacia arriba
-            rounded = math.ceil(number / multiple) * multiple
-        else:
-            # Redondear al múltiplo más cercano
-            rounded = round(number / multiple) * multiple
-
-        print(f"🔢 Redondeo: {number:.2f} → {rounded:.2f} (múltiplo de {multiple})")
-        return rounded
-
-    def draw_texts(self, draw, name, price, title_font, price_font,
-                   canvas_width, canvas_height, product_position, product_size):
-        """Dibujar textos con mejor espaciado para múltiples líneas"""
-        product_x, product_y = product_position
-        product_width, product_height = product_size
-
-        # Calcular posición Y para los textos
-        text_start_y = product_y + product_height + 35
-
-        # Dividir el nombre en líneas
-        wrapped_lines = self.wrap_text(name, title_font, canvas_width - 100)
-
-        # Dibujar nombre del producto
-        if isinstance(wrapped_lines, list):
-            # Texto multilínea
-            line_height = 38  # Espacio entre líneas
-            total_text_height = len(wrapped_lines) * line_height
-
-            for i, line in enumerate(wrapped_lines):
-                y_position = text_start_y + (i * line_height)
-                draw.text((canvas_width // 2, y_position), line,
-                          fill='black', font=title_font, anchor="mm")
-
-            # Posición del precio
-            price_y = text_start_y + total_text_height + 30
-        else:
-            # Texto de una línea
-            draw.text((canvas_width // 2, text_start_y), wrapped_lines,
-                      fill='black', font=title_font, anchor="mm")
-            price_y = text_start_y + 65
-
-        # Dibujar precio (SIEMPRE GRANDE)
-        price_text = f"${price:.2f}"
-        draw.text((canvas_width // 2, price_y), price_text,
-                  fill='red', font=price_font, anchor="mm")
-
-    def wrap_text(self, text, font, max_width):
-        """Versión definitiva - Divide por palabras respetando límites"""
-        # Limpiar texto de espacios extras
-        text = ' '.join(text.split())
-
-        # Si el texto es corto, devolver como está
-        if len(text) <= 22:
-            return text
-
-        # Límite de caracteres por línea (ajustado para mayúsculas)
-        base_chars_per_line = 22
-        uppercase_count = sum(1 for c in text if c.isupper())
-        total_chars = len(text)
-
-        if uppercase_count / total_chars > 0.6:  # Muchas mayúsculas
-            chars_per_line = 18
-        elif uppercase_count / total_chars > 0.4:  # Bastantes mayúsculas
-            chars_per_line = 20
-        else:  # Texto normal
-            chars_per_line = base_chars_per_line
-
-        words = text.split()
-        lines = []
-        current_line = []
-        current_length = 0
-
-        for word in words:
-            word_len = len(word)
-            space_len = 1 if current_line else 0  # Espacio si no es primera palabra
-
-            # Si agregar esta palabra excede el límite
-            if current_length + word_len + space_len > chars_per_line:
-                if current_line:
-                    # Guardar línea actual
-                    lines.append(' '.join(current_line))
-                    current_line = []
-                    current_length = 0
-
-                # Si ya tenemos 2 líneas, manejar la tercera especial
-                if len(lines) >= 2:
-                    # Para la tercera línea, truncar lo que queda
-                    remaining_words = ' '.join([word] + words[words.index(word) + 1:])
-                    if len(remaining_words) > chars_per_line - 3:
-                        # Buscar punto de corte natural
-                        if ' ' in remaining_words[:chars_per_line - 3]:
-                            cut_point = remaining_words[:chars_per_line - 3].rfind(' ')
-                            if cut_point > 10:  # Asegurar que queda algo legible
-                                lines.append(remaining_words[:cut_point] + "...")
-                            else:
-                                lines.append(remaining_words[:chars_per_line - 6] + "...")
-                        else:
-                            lines.append(remaining_words[:chars_per_line - 6] + "...")
-                    else:
-                        lines.append(remaining_words)
-                    break
-
-            # Agregar palabra a línea actual
-            current_line.append(word)
-            current_length += word_len + space_len
-
-        # Agregar última línea si no llegamos al límite
-        if current_line and len(lines) < 3:
-            lines.append(' '.join(current_line))
-
-        # Devolver resultado
-        if len(lines) == 1:
-            return lines[0]
-        elif len(lines) == 2:
-            return lines
-        else:  # 3 líneas
-            return lines
-
-
-# Instancias globales
-scraper = PaulinaScraper()
-image_gen = ImageGenerator()
+
+@app.before_request
+def mark_request_start():
+    request.environ['tangas.started'] = time.perf_counter()
+
+
+@app.after_request
+def report_first_request(response):
+    """Reportar la latencia del primer pedido de cada proceso"""
+    global first_request_done
+    if not first_request_done:
+        first_request_done = True
+        started = request.environ.get('tangas.started')
+        if started is not None:
+            print(f"⏱️ Primer pedido del proceso {os.getpid()} ({request.path}): "
+                  f"{(time.perf_counter() - started) * 1000:.0f}ms")
+    return response
 
 
 @app.route('/')
@@ -717,6 +99,11 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/scheduler-stats')
+def scheduler_stats():
+    return jsonify({'success': True, 'stats': scheduler.stats()})
+
+
 @app.route('/debug-scrape', methods=['POST'])
 def debug_scrape():
     data = request.json
@@ -747,10 +134,13 @@ def generate_image():
     if 'error' in product_data:
         return jsonify({'success': False, 'error': product_data['error']})
 
-    # Generar imagen (sin guardar)
-    final_image = image_gen.generate_product_image(product_data, formula)
+    # Generar imagen (en el almacén persistente si está activo, para que la descarga sea inmediata)
+    if store:
+        card_ready = image_gen.get_card_bytes(product_data, formula) is not None
+    else:
+        card_ready = image_gen.generate_product_image(product_data, formula) is not None
 
-    if final_image:
+    if card_ready:
         # Crear un ID único para la imagen
         image_id = hashlib.md5(f"{url}{formula}".encode()).hexdigest()[:10]
 
@@ -763,6 +153,122 @@ def generate_image():
         return jsonify({'success': False, 'error': 'Error generando imagen'})
 
 
+def upstream_product_limit(env_name, default, calls_per_product):
+    """Tope de productos por pedido web: el configurado en `env_name`, sin pasar
+    lo que el planificador deja pedir a la tienda dentro del presupuesto de tiempo"""
+    configured = int(os.environ.get(env_name, default))
+    budget = scheduler.capacity(app.config['REQUEST_BUDGET_SECONDS']) // calls_per_product
+    return max(1, min(configured, budget))
+
+
+def request_urls(data, max_products, hint=''):
+    """Validar la lista `urls` de un pedido; devuelve (urls, error)"""
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return None, 'El campo urls debe ser una lista de URLs'
+
+    urls = [url.strip() for url in urls if url.strip()]
+    if not urls:
+        return None, 'URLs requeridas'
+    if len(urls) > max_products:
+        return None, f'Máximo {max_products} productos por pedido{hint}'
+    return urls, None
+
+
+@app.route('/stock-query', methods=['POST'])
+def stock_query():
+    """Consultar stock de talle/color sobre una lista de productos (catálogo o colección)"""
+    data = request.json
+    # Un pedido a la tienda por producto (solo la página)
+    max_products = upstream_product_limit('MAX_STOCK_QUERY_PRODUCTS', 200, calls_per_product=1)
+    urls, error = request_urls(data, max_products, hint='; dividir la consulta en varios pedidos')
+    if error:
+        return jsonify({'success': False, 'error': error})
+
+    size = data.get('size')
+    color = data.get('color')
+    if not isinstance(size, str) or not size.strip():
+        return jsonify({'success': False, 'error': 'Talle requerido'})
+
+    def scrape_batch(url):
+        with scheduler.lane('batch'):
+            return url, scraper.scrape_product(url)
+
+    catalog = StockCatalog()
+    errors = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for url, product_data in executor.map(scrape_batch, urls):
+            if 'error' in product_data:
+                errors[url] = product_data['error']
+            else:
+                catalog.add(url, StockMatrix.from_dict(product_data['sizes_colors']))
+
+    size = size.strip()
+    return jsonify({
+        'success': True,
+        'size': size,
+        'colors_with_size': catalog.colors_with_size(size),
+        'products': catalog.products_with(size, color.strip() if isinstance(color, str) and color.strip() else None),
+        'errors': errors
+    })
+
+
+@app.route('/generate-collage', methods=['POST'])
+def generate_collage():
+    data = request.json
+    # Dos pedidos a la tienda por producto (página y foto)
+    max_products = upstream_product_limit('MAX_COLLAGE_PRODUCTS', 200, calls_per_product=2)
+    urls, error = request_urls(data, max_products,
+                               hint='; para colecciones más grandes usar python collage.py')
+    if error:
+        return jsonify({'success': False, 'error': error})
+
+    formula = data.get('formula', 'x * 1.55')
+    output_format = str(data.get('format', 'pdf')).lower()
+    if output_format not in ('pdf', 'jpeg', 'jpg', 'png'):
+        return jsonify({'success': False, 'error': 'Formato no soportado'})
+
+    renderer = get_collage_renderer()
+    try:
+        columns = int(data.get('columns', 4))
+        rows_per_page = int(data.get('rows_per_page', 4))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'columns y rows_per_page deben ser números'})
+
+    if not 1 <= columns <= renderer.MAX_COLUMNS:
+        return jsonify({'success': False, 'error': f'columns debe estar entre 1 y {renderer.MAX_COLUMNS}'})
+    if not 1 <= rows_per_page <= renderer.MAX_ROWS_PER_PAGE:
+        return jsonify({'success': False,
+                        'error': f'rows_per_page debe estar entre 1 y {renderer.MAX_ROWS_PER_PAGE}'})
+    if output_format != 'pdf' and len(urls) > renderer.MAX_SHEET_PRODUCTS:
+        return jsonify({'success': False,
+                        'error': f'Imagen única: máximo {renderer.MAX_SHEET_PRODUCTS} productos, usar PDF'})
+
+    try:
+        # Archivo temporal anónimo: las páginas se escriben a disco a medida que se arman
+        output = tempfile.TemporaryFile()
+        renderer.render(
+            urls, output, formula=formula,
+            columns=columns,
+            rows_per_page=rows_per_page,
+            output_format=output_format
+        )
+        output.seek(0)
+
+        extension = 'jpg' if output_format == 'jpeg' else output_format
+        mimetypes = {'pdf': 'application/pdf', 'jpg': 'image/jpeg', 'png': 'image/png'}
+        return send_file(
+            output,
+            mimetype=mimetypes[extension],
+            as_attachment=True,
+            download_name=f"coleccion.{extension}"
+        )
+
+    except Exception as e:
+        print(f"❌ Error generando collage: {e}")
+        return jsonify({'success': False, 'error': 'Error generando collage'})
+
+
 @app.route('/download/<image_id>')
 def download_file(image_id):
     try:
@@ -781,22 +287,19 @@ def download_file(image_id):
         if 'error' in product_data:
             return jsonify({'success': False, 'error': product_data['error']})
 
-        # Generar imagen al vuelo
-        final_image = image_gen.generate_product_image(product_data, formula)
+        # Generar imagen al vuelo (o reutilizar la del almacén persistente)
+        card_bytes = image_gen.get_card_bytes(product_data, formula)
 
-        if not final_image:
+        if not card_bytes:
             return jsonify({'success': False, 'error': 'Error generando imagen'})
 
-        # Convertir a bytes en memoria
-        img_io = io.BytesIO()
-        final_image.save(img_io, 'JPEG', quality=95)
-        img_io.seek(0)
+        img_io = io.BytesIO(card_bytes)
 
         # Crear nombre de archivo para descarga
         safe_name = re.sub(r'[^\w\-_.]', '_', product_data['name'])
         filename = f"producto_{safe_name}.jpg"
 
-        # Enviar imagen directamente sin guardar
+        # Enviar imagen directamente
         return send_file(
             img_io,
             mimetype='image/jpeg',
@@ -814,8 +317,12 @@ if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("DEBUG", "False").lower() == "true"
 
-    print("🚀 Servidor iniciado - Modo sin almacenamiento temporal")
-    print("💡 Las imágenes se generan al vuelo sin guardar archivos")
+    print(f"⏱️ Importación de la app: {IMPORT_SECONDS * 1000:.0f}ms")
+    if store:
+        print(f"🚀 Servidor iniciado - Almacén persistente en {store.root_dir}")
+    else:
+        print("🚀 Servidor iniciado - Modo sin almacenamiento temporal")
+        print("💡 Las imágenes se generan al vuelo sin guardar archivos (usar STORE_DIR para persistir)")
 
     app.run(
         host="0.0.0.0",
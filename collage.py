@@ -0,0 +1,191 @@
+"""
+Hoja de contacto / collage: muchas tarjetas de producto en una sola imagen o en un PDF.
+
+Uso:
+    python collage.py urls.txt --columns 5 --output coleccion.pdf
+    python collage.py urls.txt --columns 4 --output coleccion.jpg
+
+Pillow y el núcleo de scraping (requests, BeautifulSoup) se importan recién
+al renderizar: `--help` o un error de argumentos no los cargan, y Flask no se
+carga nunca.
+"""
+import argparse
+import io
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CollageRenderer:
+    """Compone las tarjetas de `ImageGenerator` en una grilla.
+
+    Las tarjetas se generan en paralelo con una ventana acotada y se pegan en
+    orden apenas están listas; cada tarjeta se descarta al pegarla. En PDF cada
+    página se escribe y se libera antes de armar la siguiente, así la memoria
+    no crece con la cantidad de productos. En imagen única la hoja entera vive
+    en memoria, por eso ese modo tiene un tope de productos.
+    """
+
+    MAX_COLUMNS = 10
+    MAX_ROWS_PER_PAGE = 10
+    MAX_SHEET_PRODUCTS = 40
+
+    def __init__(self, scraper, image_gen, scheduler=None):
+        self.scraper = scraper
+        self.image_gen = image_gen
+        self.scheduler = scheduler
+
+    def render(self, urls, output, formula="x * 1.55", columns=4, cell_width=360,
+               cell_height=None, rows_per_page=4, gap=12, output_format='pdf', workers=4):
+        """Escribir el collage en `output` (ruta o archivo binario con seek)"""
+        urls = list(urls)
+        cell_width = min(max(cell_width, 100), 800)
+        cell_height = cell_height or int(cell_width * 1.45)
+        output_format = output_format.lower()
+        columns = min(max(columns, 1), self.MAX_COLUMNS)
+        rows_per_page = min(max(rows_per_page, 1), self.MAX_ROWS_PER_PAGE)
+
+        if output_format != 'pdf' and len(urls) > self.MAX_SHEET_PRODUCTS:
+            raise ValueError(f"Imagen única: máximo {self.MAX_SHEET_PRODUCTS} productos; "
+                             f"para grillas más grandes usar PDF")
+
+        if output_format == 'pdf':
+            rows = rows_per_page
+        else:
+            rows = max(1, math.ceil(len(urls) / columns))
+
+        page_size = (
+            columns * cell_width + (columns + 1) * gap,
+            rows * cell_height + (rows + 1) * gap
+        )
+        per_page = columns * rows
+
+        from PIL import Image
+
+        print(f"🧩 Collage: {len(urls)} productos, grilla {columns}x{rows}, formato {output_format}")
+
+        page = None
+        pages_written = 0
+        for index, tile in enumerate(self.iter_tiles(urls, formula, (cell_width, cell_height), workers)):
+            slot = index % per_page
+            if slot == 0:
+                page = Image.new('RGB', page_size, color='white')
+
+            col, row = slot % columns, slot // columns
+            x = gap + col * (cell_width + gap) + (cell_width - tile.width) // 2
+            y = gap + row * (cell_height + gap) + (cell_height - tile.height) // 2
+            page.paste(tile, (x, y))
+            tile.close()
+
+            if output_format == 'pdf' and slot == per_page - 1:
+                self.write_pdf_page(page, output, pages_written)
+                pages_written += 1
+                page = None
+
+        if page is None and pages_written == 0:
+            page = Image.new('RGB', page_size, color='white')
+
+        if page is not None:
+            if output_format == 'pdf':
+                self.write_pdf_page(page, output, pages_written)
+                pages_written += 1
+            else:
+                save_format = 'JPEG' if output_format in ('jpg', 'jpeg') else output_format.upper()
+                page.save(output, save_format, quality=90)
+                pages_written = 1
+
+        print(f"✅ Collage listo: {pages_written} página(s)")
+        return pages_written
+
+    def write_pdf_page(self, page, output, pages_written):
+        """Agregar una página al PDF (la primera crea el archivo)"""
+        if pages_written == 0:
+            page.save(output, 'PDF', resolution=150)
+        else:
+            page.save(output, 'PDF', resolution=150, append=True)
+        page.close()
+
+    def iter_tiles(self, urls, formula, cell_size, workers):
+        """Tarjetas en el orden de `urls`, con a lo sumo `workers` en vuelo"""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for url in urls:
+                pending.append(executor.submit(self.render_tile, url, formula, cell_size))
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def render_tile(self, url, formula, cell_size):
+        """Tarjeta de un producto reducida al tamaño de la celda"""
+        if self.scheduler:
+            with self.scheduler.lane('batch'):
+                card_bytes, error = self.card_for(url, formula)
+        else:
+            card_bytes, error = self.card_for(url, formula)
+
+        if card_bytes is None:
+            return self.error_tile(cell_size, error)
+
+        from PIL import Image
+
+        tile = Image.open(io.BytesIO(card_bytes))
+        tile.draft('RGB', cell_size)  # Decodificar JPEG a escala reducida
+        tile = tile.convert('RGB')
+        tile.thumbnail(cell_size, Image.Resampling.LANCZOS)
+        return tile
+
+    def card_for(self, url, formula):
+        """Bytes de la tarjeta (reutiliza el almacén persistente si está activo)"""
+        product_data = self.scraper.scrape_product(url)
+        if 'error' in product_data:
+            return None, product_data['error']
+
+        card_bytes = self.image_gen.get_card_bytes(product_data, formula)
+        if card_bytes is None:
+            return None, 'Error generando imagen'
+        return card_bytes, None
+
+    def error_tile(self, cell_size, error):
+        from PIL import Image, ImageDraw
+        from core import default_font, load_font
+
+        tile = Image.new('RGB', cell_size, color='#f8d7da')
+        draw = ImageDraw.Draw(tile)
+        font = load_font(16) or default_font()
+
+        message = (error or 'Error')[:40]
+        draw.text((cell_size[0] / 2, cell_size[1] / 2), f"✗ {message}",
+                  fill='#721c24', font=font, anchor="mm")
+        return tile
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collage de productos en una imagen o PDF')
+    parser.add_argument('urls_file', help='archivo con una URL de producto por línea')
+    parser.add_argument('--output', '-o', default='collage.pdf')
+    parser.add_argument('--formula', default='x * 1.55')
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--cell-width', type=int, default=360)
+    parser.add_argument('--rows-per-page', type=int, default=4, help='solo para PDF')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.urls_file) as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    from core import scraper, image_gen, scheduler
+
+    output_format = args.output.rsplit('.', 1)[-1] if '.' in args.output else 'pdf'
+    renderer = CollageRenderer(scraper, image_gen, scheduler)
+    try:
+        renderer.render(urls, args.output, formula=args.formula, columns=args.columns,
+                        cell_width=args.cell_width, rows_per_page=args.rows_per_page,
+                        output_format=output_format, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"💾 Collage guardado en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
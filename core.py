@@ -0,0 +1,1487 @@
+"""
+Núcleo sin Flask: scraping de productos, render de tarjetas, almacén
+persistente y planificador de pedidos.
+
+Lo usan la app web (app.py) y las herramientas de línea de comandos
+(collage.py), que así no cargan Flask.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+import soupsieve as sv
+from PIL import Image, ImageDraw, ImageFont
+import functools
+import io
+import os
+import re
+import sys
+import urllib.parse
+import math
+import hashlib
+import heapq
+import itertools
+import json
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PersistentStore:
+    """Almacén persistente opcional: blobs direccionados por contenido + índice SQLite.
+
+    El índice en SQLite es la fuente de verdad compartida entre los workers:
+    `blobs` lleva las referencias de cada contenido y `meta` el total de bytes
+    en disco, y ambos se actualizan en la misma transacción que `entries`, así
+    el límite STORE_MAX_MB vale para todos los procesos juntos. Los archivos
+    solo se agregan o borran con la transacción de escritura tomada.
+    """
+
+    def __init__(self, root_dir, max_bytes=512 * 1024 * 1024):
+        self.root_dir = root_dir
+        self.blobs_dir = os.path.join(root_dir, 'blobs')
+        self.index_path = os.path.join(root_dir, 'index.sqlite3')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = None
+        self.conn_pid = None
+        self.index = {}
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.load_index()
+
+    @classmethod
+    def from_env(cls):
+        """Crear el almacén solo si STORE_DIR está configurado"""
+        root_dir = os.environ.get('STORE_DIR')
+        if not root_dir:
+            return None
+
+        max_mb = int(os.environ.get('STORE_MAX_MB', 512))
+        return cls(root_dir, max_bytes=max_mb * 1024 * 1024)
+
+    def connection(self):
+        """Conexión SQLite por proceso (no se comparte entre workers tras el fork)"""
+        if self.conn is None or self.conn_pid != os.getpid():
+            import sqlite3
+
+            # Transacciones explícitas: BEGIN IMMEDIATE toma el lock de escritura de entrada
+            conn = sqlite3.connect(self.index_path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self.transaction(conn):
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS entries ('
+                    'key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, '
+                    'created REAL NOT NULL, accessed REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS blobs ('
+                    'digest TEXT PRIMARY KEY, size INTEGER NOT NULL, refs INTEGER NOT NULL)'
+                )
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+                # Índices creados antes de llevar el total compartido: reconstruirlo una vez
+                if conn.execute("SELECT 1 FROM meta WHERE name = 'total_bytes'").fetchone() is None:
+                    conn.execute('DELETE FROM blobs')
+                    conn.execute(
+                        'INSERT INTO blobs (digest, size, refs) '
+                        'SELECT digest, MAX(size), COUNT(*) FROM entries GROUP BY digest'
+                    )
+                    conn.execute(
+                        "INSERT INTO meta (name, value) "
+                        "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM blobs"
+                    )
+            self.conn = conn
+            self.conn_pid = os.getpid()
+        return self.conn
+
+    @staticmethod
+    @contextmanager
+    def transaction(conn):
+        """Transacción de escritura: se confirma al salir o se revierte ante un error"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def load_index(self):
+        """Cargar el índice completo en memoria al arrancar (arranque en caliente)"""
+        with self.lock:
+            conn = self.connection()
+            rows = conn.execute('SELECT key, digest, size, created, accessed FROM entries').fetchall()
+            self.index = {
+                key: {'digest': digest, 'size': size, 'created': created, 'accessed': accessed}
+                for key, digest, size, created, accessed in rows
+            }
+            known = {digest for (digest,) in conn.execute('SELECT digest FROM blobs')}
+
+        # Limpiar temporales de escrituras interrumpidas y blobs sin entrada en el índice
+        # (crash entre os.replace y el COMMIT). Los blobs recientes se respetan porque
+        # otro worker puede estar a punto de confirmarlos.
+        swept = 0
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.blobs_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if filename.startswith('.tmp-'):
+                        os.remove(path)
+                    elif filename not in known and now - os.path.getmtime(path) > 60:
+                        os.remove(path)
+                        swept += 1
+                except OSError:
+                    pass
+
+        print(f"💾 Índice persistente cargado: {len(self.index)} entradas en {self.root_dir}"
+              + (f" ({swept} blobs huérfanos eliminados)" if swept else ""))
+
+    def total_bytes(self):
+        """Bytes en disco según el índice compartido (todos los workers)"""
+        with self.lock:
+            row = self.connection().execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def get(self, key, max_age=None):
+        """Leer un blob por clave; None si no existe o está vencido"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                # Puede haberlo escrito otro worker después de nuestro arranque
+                row = self.connection().execute(
+                    'SELECT digest, size, created, accessed FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = {'digest': row[0], 'size': row[1], 'created': row[2], 'accessed': row[3]}
+                self.index[key] = entry
+
+        now = time.time()
+        if max_age is not None and now - entry['created'] > max_age:
+            return None
+
+        try:
+            with open(self.blob_path(entry['digest']), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # Blob desalojado o reemplazado por otro worker
+            with self.lock:
+                self.index.pop(key, None)
+            return None
+
+        # Actualizar acceso como mucho una vez por minuto para no escribir en cada hit
+        if now - entry['accessed'] > 60:
+            with self.lock:
+                entry['accessed'] = now
+                self.connection().execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+
+        return data
+
+    def put(self, key, data):
+        """Guardar un blob de forma atómica y registrarlo en el índice"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        blob_dir = os.path.dirname(path)
+        tmp_path = None
+        placed = False
+
+        try:
+            # La escritura y el fsync van fuera del lock; el os.replace, dentro de la
+            # transacción, para que un desalojo de otro worker no borre el blob entre
+            # medio
+            os.makedirs(blob_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=blob_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            now = time.time()
+            with self.lock:
+                conn = self.connection()
+                with self.transaction(conn):
+                    placed = not os.path.exists(path)
+                    os.replace(tmp_path, path)
+                    tmp_path = None
+
+                    previous = conn.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+                    conn.execute(
+                        'INSERT OR REPLACE INTO entries (key, digest, size, created, accessed) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (key, digest, len(data), now, now)
+                    )
+                    if previous is None or previous[0] != digest:
+                        self.add_ref(conn, digest, len(data))
+                        # Si la clave cambió de contenido, el blob anterior puede haber quedado sin uso
+                        if previous is not None and self.drop_ref(conn, previous[0]):
+                            self.remove_blob(previous[0])
+
+                    evicted = self.evict(conn)
+                placed = False
+
+                self.index[key] = {'digest': digest, 'size': len(data), 'created': now, 'accessed': now}
+                for evicted_key in evicted:
+                    self.index.pop(evicted_key, None)
+
+        except Exception as e:
+            # Transacción revertida: el blob que recién colocamos no quedó registrado
+            if placed:
+                self.remove_blob(digest)
+            print(f"❌ Error guardando en almacén persistente: {e}")
+
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_ref(self, conn, digest, size):
+        """Sumar una referencia al blob (y su tamaño al total si es nuevo)"""
+        updated = conn.execute('UPDATE blobs SET refs = refs + 1 WHERE digest = ?', (digest,))
+        if updated.rowcount == 0:
+            conn.execute('INSERT INTO blobs (digest, size, refs) VALUES (?, ?, 1)', (digest, size))
+            conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (size,))
+
+    def drop_ref(self, conn, digest):
+        """Restar una referencia; devuelve True si el blob quedó sin uso"""
+        conn.execute('UPDATE blobs SET refs = refs - 1 WHERE digest = ?', (digest,))
+        row = conn.execute('SELECT size, refs FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is None or row[1] > 0:
+            return False
+
+        conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+        conn.execute("UPDATE meta SET value = value - ? WHERE name = 'total_bytes'", (row[0],))
+        return True
+
+    def remove_blob(self, digest):
+        try:
+            os.remove(self.blob_path(digest))
+        except OSError:
+            pass
+
+    def evict(self, conn):
+        """Desalojar las entradas menos usadas hasta quedar bajo el límite de tamaño.
+
+        Corre dentro de la transacción de `put`: el total es el de `meta`, que
+        incluye lo escrito por todos los workers. Devuelve las claves desalojadas.
+        """
+        total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        evicted = []
+        while total > self.max_bytes:
+            rows = conn.execute(
+                'SELECT key, digest FROM entries ORDER BY accessed ASC LIMIT 64'
+            ).fetchall()
+            if not rows:
+                break
+
+            for key, digest in rows:
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                evicted.append(key)
+
+                # El blob puede estar referenciado por otra clave con el mismo contenido
+                if self.drop_ref(conn, digest):
+                    self.remove_blob(digest)
+                    total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+                    if total <= self.max_bytes:
+                        break
+
+        if evicted:
+            print(f"🧹 Almacén persistente: {len(evicted)} entradas desalojadas ({total} bytes en uso)")
+        return evicted
+
+
+class RequestScheduler:
+    """Planificador de pedidos a la tienda: token bucket y concurrencia máxima por host,
+    con carril prioritario para pedidos interactivos sobre trabajos en lote.
+
+    Los límites aplican por proceso: bajo gunicorn, `split_between` reparte el
+    presupuesto configurado entre los workers antes del fork. La prioridad entre
+    carriles solo actúa dentro de un proceso con varios hilos (workers gthread o
+    el pool de hilos de un collage/consulta de stock); un worker sync atiende un
+    pedido por vez y nunca tiene un interactivo y un lote en la misma cola."""
+
+    LANES = {'interactive': 0, 'batch': 1}
+
+    def __init__(self, rate=5.0, burst=10, max_inflight=4, max_wait=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.max_wait = max_wait
+        self.cond = threading.Condition()
+        self.counter = itertools.count()
+        self.local = threading.local()
+        self.hosts = {}
+        self.lane_stats = {
+            lane: {'requests': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'timeouts': 0}
+            for lane in self.LANES
+        }
+
+    @classmethod
+    def from_env(cls):
+        rate = float(os.environ.get('UPSTREAM_RATE', 5))
+        burst = int(os.environ.get('UPSTREAM_BURST', 10))
+        max_inflight = int(os.environ.get('UPSTREAM_MAX_INFLIGHT', 4))
+
+        if rate <= 0:
+            raise ValueError(f"UPSTREAM_RATE debe ser mayor que 0 (recibido: {rate})")
+        if burst < 1:
+            raise ValueError(f"UPSTREAM_BURST debe ser al menos 1 (recibido: {burst})")
+        if max_inflight < 1:
+            raise ValueError(f"UPSTREAM_MAX_INFLIGHT debe ser al menos 1 (recibido: {max_inflight})")
+
+        return cls(
+            rate=rate,
+            burst=burst,
+            max_inflight=max_inflight,
+            max_wait=float(os.environ.get('UPSTREAM_MAX_WAIT', 30))
+        )
+
+    def split_between(self, workers):
+        """Repartir tasa, ráfaga y concurrencia entre `workers` procesos.
+
+        Ráfaga y concurrencia no bajan de 1, así que con más workers que
+        ráfaga el total puede superar lo configurado.
+        """
+        if workers <= 1:
+            return
+
+        with self.cond:
+            self.rate = self.rate / workers
+            self.burst = max(1, self.burst // workers)
+            self.max_inflight = max(1, self.max_inflight // workers)
+            self.hosts = {}
+
+        print(f"🚦 Límites por worker ({workers} workers): {self.rate:.2f} pedidos/s, "
+              f"ráfaga {self.burst}, {self.max_inflight} en vuelo por host")
+
+    def capacity(self, seconds):
+        """Pedidos a un mismo host que caben en `seconds` (ráfaga + recarga)"""
+        return int(self.burst + self.rate * seconds)
+
+    @contextmanager
+    def lane(self, name):
+        """Ejecutar los pedidos del hilo actual en el carril indicado"""
+        if name not in self.LANES:
+            raise ValueError(f"Carril desconocido: {name} (opciones: {', '.join(self.LANES)})")
+
+        previous = getattr(self.local, 'lane', 'interactive')
+        self.local.lane = name
+        try:
+            yield
+        finally:
+            self.local.lane = previous
+
+    @contextmanager
+    def slot(self, url):
+        """Reservar un lugar para pedir `url` respetando los límites de su host"""
+        host = urllib.parse.urlparse(url).netloc
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def host_state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = {
+                'tokens': float(self.burst),
+                'updated': time.monotonic(),
+                'inflight': 0,
+                'waiters': []
+            }
+            self.hosts[host] = state
+        return state
+
+    def refill(self, state, now):
+        elapsed = now - state['updated']
+        state['tokens'] = min(float(self.burst), state['tokens'] + elapsed * self.rate)
+        state['updated'] = now
+
+    def acquire(self, host):
+        lane = getattr(self.local, 'lane', 'interactive')
+        ticket = (self.LANES[lane], next(self.counter))
+
+        with self.cond:
+            state = self.host_state(host)
+            heapq.heappush(state['waiters'], ticket)
+            start = time.monotonic()
+            deadline = start + self.max_wait
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.refill(state, now)
+
+                    if (state['waiters'][0] == ticket
+                            and state['inflight'] < self.max_inflight
+                            and state['tokens'] >= 1):
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.lane_stats[lane]['timeouts'] += 1
+                        raise TimeoutError(f"Tiempo de espera agotado para {host} (carril {lane})")
+
+                    # Despertar cuando se recargue un token o se libere un lugar
+                    timeout = remaining
+                    if state['tokens'] < 1:
+                        timeout = min(timeout, (1 - state['tokens']) / self.rate)
+                    self.cond.wait(timeout)
+
+            except BaseException:
+                state['waiters'].remove(ticket)
+                heapq.heapify(state['waiters'])
+                self.cond.notify_all()
+                raise
+
+            heapq.heappop(state['waiters'])
+            state['tokens'] -= 1
+            state['inflight'] += 1
+
+            waited = time.monotonic() - start
+            stats = self.lane_stats[lane]
+            stats['requests'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+
+            # El siguiente en la cola puede tener lugar disponible
+            self.cond.notify_all()
+
+        if waited > 0.5:
+            print(f"⏳ Pedido a {host} esperó {waited:.2f}s en carril {lane}")
+
+    def release(self, host):
+        with self.cond:
+            self.hosts[host]['inflight'] -= 1
+            self.cond.notify_all()
+
+    def stats(self):
+        """Profundidad de cola por host y carril, y tiempos de espera por carril"""
+        with self.cond:
+            priorities = {priority: lane for lane, priority in self.LANES.items()}
+            hosts = {}
+            for host, state in self.hosts.items():
+                queued = {lane: 0 for lane in self.LANES}
+                for priority, _ in state['waiters']:
+                    queued[priorities[priority]] += 1
+                hosts[host] = {
+                    'inflight': state['inflight'],
+                    'queued': queued,
+                    'tokens': round(state['tokens'], 2)
+                }
+
+            lanes = {}
+            for lane, stats in self.lane_stats.items():
+                avg_wait = stats['total_wait'] / stats['requests'] if stats['requests'] else 0.0
+                lanes[lane] = {
+                    'requests': stats['requests'],
+                    'avg_wait': round(avg_wait, 4),
+                    'max_wait': round(stats['max_wait'], 4),
+                    'timeouts': stats['timeouts']
+                }
+
+            return {
+                'limits': {
+                    'rate': self.rate,
+                    'burst': self.burst,
+                    'max_inflight': self.max_inflight
+                },
+                'hosts': hosts,
+                'lanes': lanes
+            }
+
+
+class StockMatrix:
+    """Disponibilidad talle x color: una máscara de bits por color (bit j = talle j).
+
+    En el JSON se serializa como {'sizes': [...], 'colors': [...], 'stock': [máscaras]}.
+    """
+
+    __slots__ = ('sizes', 'colors', 'rows')
+
+    def __init__(self, sizes, colors, rows):
+        self.sizes = [sys.intern(size) for size in sizes]
+        self.colors = [sys.intern(color) for color in colors]
+        self.rows = list(rows)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        colors = data.get('colors', [])
+        return cls(data.get('sizes', []), colors, data.get('stock', [0] * len(colors)))
+
+    def to_dict(self):
+        return {'sizes': self.sizes, 'colors': self.colors, 'stock': self.rows}
+
+    def is_available(self, color_idx, size_idx):
+        return bool(self.rows[color_idx] >> size_idx & 1)
+
+
+class StockCatalog:
+    """Índice de stock de muchos productos con talles/colores internados.
+
+    Para cada talle guarda, por producto, una máscara de bits sobre los ids
+    globales de color; así "qué colores tienen talle M" en todo el catálogo es
+    un OR de enteros.
+    """
+
+    def __init__(self):
+        self.size_ids = {}
+        self.color_ids = {}
+        self.colors = []
+        self.by_size = {}
+
+    def intern_size(self, size):
+        if size not in self.size_ids:
+            self.size_ids[size] = len(self.size_ids)
+        return self.size_ids[size]
+
+    def intern_color(self, color):
+        if color not in self.color_ids:
+            self.color_ids[color] = len(self.colors)
+            self.colors.append(color)
+        return self.color_ids[color]
+
+    def add(self, key, matrix):
+        """Agregar (o reemplazar) el stock de un producto"""
+        self.remove(key)
+        color_ids = [self.intern_color(color) for color in matrix.colors]
+
+        for size_idx, size in enumerate(matrix.sizes):
+            mask = 0
+            for color_id, row in zip(color_ids, matrix.rows):
+                if row >> size_idx & 1:
+                    mask |= 1 << color_id
+            if mask:
+                self.by_size.setdefault(self.intern_size(size), {})[key] = mask
+
+    def remove(self, key):
+        for masks in self.by_size.values():
+            masks.pop(key, None)
+
+    def decode_colors(self, mask):
+        return [color for color_id, color in enumerate(self.colors) if mask >> color_id & 1]
+
+    def colors_with_size(self, size):
+        """Colores con stock del talle en algún producto del catálogo"""
+        combined = 0
+        for mask in self.by_size.get(self.size_ids.get(size), {}).values():
+            combined |= mask
+        return self.decode_colors(combined)
+
+    def products_with(self, size, color=None):
+        """Productos con stock del talle (y del color, si se indica)"""
+        masks = self.by_size.get(self.size_ids.get(size), {})
+        if color is None:
+            return list(masks)
+
+        color_id = self.color_ids.get(color)
+        if color_id is None:
+            return []
+        return [key for key, mask in masks.items() if mask >> color_id & 1]
+
+
+def normalize_host(host):
+    """Host en minúsculas y sin "www." (clave de perfiles y de su memoria)"""
+    host = (host or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class ExtractionProfile:
+    """Reglas de extracción de una tienda: selectores y regex precompilados.
+
+    Cada campo tiene una cascada de estrategias en orden de prioridad y siempre
+    gana la primera que encuentra algo. Un selector puede ser una tupla de
+    alternativas equivalentes (mismo nivel de prioridad): dentro de ese nivel
+    se prueba primero la que funcionó la última vez en el mismo host. Nunca se
+    adelanta una estrategia por encima de otra de mayor prioridad.
+
+    La memoria por host solo se lleva para los hosts propios del perfil; el
+    resto (cualquier URL que mande un usuario) comparte un único lugar, así
+    la memoria no crece con la cantidad de hosts distintos.
+    """
+
+    def __init__(self, name, hosts=(), name_input='descripcion', name_selectors=(),
+                 price_input='precio', price_selectors=(), price_pattern=r'\$?\s*(\d+[.,]\d+)',
+                 image_selectors=(), image_path_hint=None, thumb_markers=('thumb', 'small', 'mini'),
+                 default_name='Producto'):
+        self.name = name
+        self.hosts = tuple(normalize_host(host) for host in hosts)
+        self.default_name = default_name
+        self.price_regex = re.compile(price_pattern)
+        self.image_path_hint = image_path_hint
+        self.thumb_markers = tuple(thumb_markers)
+        self.last_strategy = {}
+
+        # Por campo, una lista de niveles de prioridad; cada nivel, una lista de (etiqueta, estrategia)
+        self.strategies = {'name': [], 'price': [], 'image': []}
+
+        if name_input:
+            self.strategies['name'].append([(f"input[{name_input}]", self.input_value(name_input))])
+        self.add_selector_tiers('name', name_selectors, self.selector_text)
+
+        if price_input:
+            self.strategies['price'].append([(f"input[{price_input}]", self.input_price(price_input))])
+        self.add_selector_tiers('price', price_selectors, self.selector_price)
+
+        self.add_selector_tiers('image', image_selectors, self.selector_src)
+        if image_path_hint:
+            self.strategies['image'].append([(f"img[{image_path_hint}]", self.scan_images)])
+
+    def add_selector_tiers(self, field, selectors, build):
+        for entry in selectors:
+            alternatives = entry if isinstance(entry, tuple) else (entry,)
+            self.strategies[field].append(
+                [(selector, build(sv.compile(selector))) for selector in alternatives]
+            )
+
+    # --- Estrategias ---
+
+    def input_value(self, input_name):
+        def strategy(soup):
+            element = soup.find('input', {'name': input_name})
+            if element and element.get('value'):
+                return element['value'].strip() or None
+            return None
+        return strategy
+
+    def selector_text(self, compiled):
+        def strategy(soup):
+            element = compiled.select_one(soup)
+            if element and element.text.strip():
+                return element.text.strip()
+            return None
+        return strategy
+
+    def input_price(self, input_name):
+        def strategy(soup):
+            element = soup.find('input', {'name': input_name})
+            if element and element.get('value'):
+                try:
+                    return float(element['value'])
+                except ValueError:
+                    return None
+            return None
+        return strategy
+
+    def selector_price(self, compiled):
+        def strategy(soup):
+            for element in compiled.select(soup):
+                matches = self.price_regex.findall(element.text)
+                if matches:
+                    return float(matches[0].replace(',', '.'))
+            return None
+        return strategy
+
+    def selector_src(self, compiled):
+        def strategy(soup):
+            for img in compiled.select(soup):
+                img_src = img.get('src', '').strip()
+                if img_src:
+                    return img_src
+            return None
+        return strategy
+
+    def scan_images(self, soup):
+        for img in soup.find_all('img'):
+            img_src = img.get('src', '')
+            if self.image_path_hint in img_src:
+                if not any(thumb in img_src.lower() for thumb in self.thumb_markers):
+                    return img_src
+        return None
+
+    # --- Ejecución ---
+
+    def run(self, field, soup, host=''):
+        """Probar los niveles en orden de prioridad; dentro de cada nivel, primero
+        la alternativa que funcionó la última vez en este host"""
+        memory_host = host if host in self.hosts else None
+        for tier_index, tier in enumerate(self.strategies[field]):
+            memory_key = (memory_host, field, tier_index)
+            last = self.last_strategy.get(memory_key, 0)
+            order = [last] + [i for i in range(len(tier)) if i != last]
+
+            for index in order:
+                label, strategy = tier[index]
+                try:
+                    value = strategy(soup)
+                except Exception:
+                    continue
+                if value is not None:
+                    if len(tier) > 1:
+                        self.last_strategy[memory_key] = index
+                    print(f"✅ [{self.name}] {field} con '{label}': {value}")
+                    return value
+
+        return None
+
+    def extract_name(self, soup, host=''):
+        name = self.run('name', soup, host)
+        return name if name is not None else self.default_name
+
+    def extract_price(self, soup, host=''):
+        price = self.run('price', soup, host)
+        return price if price is not None else 0.0
+
+    def extract_image(self, soup, host=''):
+        """Devuelve el src tal como aparece en la página (relativo o absoluto)"""
+        return self.run('image', soup, host)
+
+
+class ProfileRegistry:
+    """Perfiles de extracción por host; elección O(1) con un dict"""
+
+    def __init__(self, default):
+        self.default = default
+        self.by_host = {}
+        self.register(default)
+
+    def register(self, profile):
+        for host in profile.hosts:
+            self.by_host[host] = profile
+        return profile
+
+    def host_for_url(self, url):
+        return normalize_host(urllib.parse.urlparse(url).hostname)
+
+    def for_url(self, url):
+        return self.by_host.get(self.host_for_url(url), self.default)
+
+
+# Perfil de Paulina Mayorista (también se usa para hosts sin perfil propio)
+PAULINA_PROFILE = ExtractionProfile(
+    'paulina',
+    hosts=['paulinamayorista.com.ar'],
+    name_selectors=['h3', 'h1', ('.product-title', '.product-name')],
+    price_selectors=['.title strong', 'p.title strong', ('.precio', '.price')],
+    image_selectors=[
+        '.tz-gallery .col-sm-12.col-md-12 img.img-responsive',  # Imagen principal en galería
+        '.tz-gallery img.img-responsive',  # Cualquier imagen responsive en galería
+        '.tz-gallery img',  # Cualquier imagen en galería
+        'a.lightbox img'  # Imágenes que abren lightbox
+    ],
+    image_path_hint='uploads/products/',
+    default_name='Producto Paulina Mayorista'
+)
+
+profiles = ProfileRegistry(PAULINA_PROFILE)
+
+
+class PaulinaScraper:
+    def __init__(self, store=None, scheduler=None):
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+
+        # Pool de conexiones dimensionado para los pedidos en vuelo permitidos por host
+        pool_size = scheduler.max_inflight if scheduler else 10
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.store = store
+        self.scheduler = scheduler
+        self.html_ttl = int(os.environ.get('STORE_HTML_TTL', 3600))
+
+    def scrape_product(self, url):
+        try:
+            print(f"🔍 Scraping URL: {url}")
+            html = self.fetch_html(url)
+            product_data = self.parse_html(html, url)
+
+            print(f"✅ Datos extraídos: {product_data}")
+            return product_data
+
+        except Exception as e:
+            print(f"❌ Error en scraping: {e}")
+            return {'error': str(e)}
+
+    def parse_html(self, html, url):
+        """Extraer los datos del producto de un HTML ya descargado (sin red)"""
+        profile = profiles.for_url(url)
+        host = profiles.host_for_url(url)
+        soup = BeautifulSoup(html, 'html.parser')
+
+        return {
+            'name': self.extract_name(soup, profile, host),
+            'price': self.extract_price(soup, profile, host),
+            'image_url': self.extract_image(soup, url, profile),
+            'sizes_colors': self.extract_sizes_and_colors(soup),
+            'original_url': url
+        }
+
+    def fetch_html(self, url):
+        """Descargar el HTML de la página (o leerlo del almacén persistente)"""
+        store_key = f"html:{url}"
+        if self.store:
+            cached = self.store.get(store_key, max_age=self.html_ttl)
+            if cached is not None:
+                print(f"💾 HTML desde almacén persistente: {url}")
+                return cached
+
+        if self.scheduler:
+            with self.scheduler.slot(url):
+                response = self.session.get(url, timeout=10)
+        else:
+            response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+
+        if self.store:
+            self.store.put(store_key, response.content)
+
+        return response.content
+
+    def extract_name(self, soup, profile=None, host=''):
+        """Extraer nombre del producto"""
+        return (profile or profiles.default).extract_name(soup, host)
+
+    def extract_price(self, soup, profile=None, host=''):
+        """Extraer precio del producto"""
+        return (profile or profiles.default).extract_price(soup, host)
+
+    def extract_image(self, soup, base_url, profile=None):
+        """Extraer imagen PRINCIPAL del producto"""
+        host = profiles.host_for_url(base_url)
+        img_src = (profile or profiles.default).extract_image(soup, host)
+        if not img_src:
+            print("❌ No se pudo encontrar la imagen del producto")
+            return None
+
+        full_url = self.make_absolute_url(img_src, base_url)
+        print(f"✅ Imagen principal: {full_url}")
+        return full_url
+
+    def extract_sizes_and_colors(self, soup):
+        """Extraer talles, colores y stock real de cada combinación"""
+        print("🎨 Extrayendo talles y colores...")
+
+        sizes = []
+        colors = []
+        rows = []
+
+        try:
+            table = soup.find('table')
+            if not table:
+                return StockMatrix(sizes, colors, rows).to_dict()
+
+            # 1. TALLES - Buscar th en thead
+            thead = table.find('thead')
+            if thead:
+                th_elements = thead.find_all('th')[1:]  # Saltar primer th vacío
+                for th in th_elements:
+                    size = th.get_text(strip=True)
+                    if size:
+                        sizes.append(size)
+
+            # Si no hay talles, usar UNICO
+            if not sizes:
+                sizes = ['UNICO']
+
+            # 2. COLORES - Una fila por color: primera celda el nombre, el resto el stock por talle
+            tbody = table.find('tbody')
+            if tbody:
+                for tr in tbody.find_all('tr'):
+                    cells = tr.find_all(['td', 'th'], recursive=False)
+                    if not cells:
+                        continue
+
+                    name_cell = cells[0].find('span') or cells[0]
+                    color_name = name_cell.get_text(strip=True)
+                    if not color_name or color_name in colors:
+                        continue
+
+                    stock_cells = cells[1:]
+                    if stock_cells:
+                        row = 0
+                        for size_idx, cell in enumerate(stock_cells[:len(sizes)]):
+                            if self.cell_in_stock(cell):
+                                row |= 1 << size_idx
+                    else:
+                        # Sin celdas por talle no hay dato de stock: se asume disponible
+                        row = (1 << len(sizes)) - 1
+
+                    colors.append(color_name)
+                    rows.append(row)
+
+            print(f"✅ RESULTADO: {len(colors)} colores → {colors}")
+            print(f"✅ RESULTADO: {len(sizes)} talles → {sizes}")
+
+        except Exception as e:
+            print(f"❌ Error: {e}")
+
+        return StockMatrix(sizes, colors, rows).to_dict()
+
+    def cell_in_stock(self, cell):
+        """Decidir si una celda de la tabla indica stock disponible"""
+        classes = ' '.join(cell.get('class', [])).lower()
+        for element in cell.find_all(True):
+            classes += ' ' + ' '.join(element.get('class', [])).lower()
+        if any(marker in classes for marker in ('sin-stock', 'agotado', 'disabled', 'no-stock')):
+            return False
+
+        cell_input = cell.find('input')
+        if cell_input is not None:
+            if cell_input.has_attr('disabled') or cell_input.has_attr('readonly'):
+                return False
+            return cell_input.get('max', '').strip() != '0'
+
+        # Celda vacía: la tienda no informa falta de stock (se mantiene el criterio anterior)
+        text = cell.get_text(strip=True).lower()
+        if text in ('-', '—', 'x', '✗', '0', 'no', 'sin stock', 'agotado'):
+            return False
+        return True
+
+    def make_absolute_url(self, img_src, base_url):
+        """Convertir URL relativa a absoluta"""
+        if img_src.startswith('//'):
+            return 'https:' + img_src
+        elif img_src.startswith('/'):
+            parsed_url = urllib.parse.urlparse(base_url)
+            return f"{parsed_url.scheme}://{parsed_url.netloc}{img_src}"
+        elif img_src.startswith('http'):
+            return img_src
+        else:
+            # Para URLs relativas como "uploads/products/LC7326.Ijpg.jpg"
+            parsed_url = urllib.parse.urlparse(base_url)
+            base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+            if img_src.startswith('/'):
+                return f"{base_domain}{img_src}"
+            else:
+                return f"{base_domain}/{img_src}"
+
+
+FONT_PATHS = ("arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(size, paths=("arial.ttf",)):
+    """Primera fuente TrueType disponible de `paths` en ese tamaño, o None (se resuelve una vez)"""
+    for fp in paths:
+        try:
+            return ImageFont.truetype(fp, size)
+        except OSError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def default_font():
+    return ImageFont.load_default()
+
+
+class ImageGenerator:
+    def __init__(self, store=None, scheduler=None, session=None):
+        self.store = store
+        self.scheduler = scheduler
+        self.session = session or requests.Session()
+
+    def generate_product_image(self, product_data, price_formula="x * 1.55"):
+        try:
+            print(f"🎨 Generando imagen para: {product_data['name']}")
+
+            # Crear imagen del producto
+            product_image = self.get_product_image(product_data['image_url'])
+
+            # Obtener dimensiones de la imagen original
+            original_width, original_height = product_image.size
+            print(f"📐 Dimensiones originales: {original_width}x{original_height}")
+
+            # Calcular dimensiones del canvas final (más alto para la tabla)
+            canvas_width, canvas_height, product_size, product_position = self.calculate_layout(
+                original_width, original_height, product_data.get('sizes_colors')
+            )
+
+            # Crear imagen final con dimensiones dinámicas
+            final_image = Image.new('RGB', (canvas_width, canvas_height), color='white')
+            draw = ImageDraw.Draw(final_image)
+
+            # Dibujar tabla de talles y colores si existe
+            table_height = self.draw_sizes_colors_table(
+                draw, product_data.get('sizes_colors', {}),
+                canvas_width, canvas_height
+            )
+
+            # Ajustar posición del producto para dejar espacio para la tabla
+            adjusted_product_position = (product_position[0], product_position[1] + table_height)
+
+            # Redimensionar y pegar imagen del producto manteniendo relación de aspecto
+            resized_product = self.resize_product_image(product_image, product_size)
+            final_image.paste(resized_product, adjusted_product_position)
+
+            # Configurar fuentes
+            title_font, price_font, table_font = self.load_fonts(canvas_width, product_data['name'])
+
+            # Calcular precio
+            original_price = product_data['price']
+            modified_price = self.calculate_price(original_price, price_formula)
+
+            print(f"💰 Precio original: {original_price}, Precio modificado: {modified_price}")
+
+            # Dibujar textos en posiciones dinámicas
+            self.draw_texts(draw, product_data['name'], modified_price, title_font, price_font,
+                            canvas_width, canvas_height, adjusted_product_position, product_size)
+
+            # Devolver imagen en memoria (sin guardar)
+            return final_image
+
+        except Exception as e:
+            print(f"❌ Error generando imagen: {e}")
+            return None
+
+    def card_key(self, product_data, price_formula):
+        """Clave de la tarjeta derivada de los datos del producto y la fórmula"""
+        payload = json.dumps({'product': product_data, 'formula': price_formula}, sort_keys=True)
+        return f"card:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def get_card_bytes(self, product_data, price_formula="x * 1.55"):
+        """Obtener la tarjeta codificada en JPEG (desde el almacén si ya existe)"""
+        card_key = self.card_key(product_data, price_formula)
+        if self.store:
+            cached = self.store.get(card_key)
+            if cached is not None:
+                print("💾 Tarjeta desde almacén persistente")
+                return cached
+
+        final_image = self.generate_product_image(product_data, price_formula)
+        if not final_image:
+            return None
+
+        img_io = io.BytesIO()
+        final_image.save(img_io, 'JPEG', quality=95)
+        card_bytes = img_io.getvalue()
+
+        if self.store:
+            self.store.put(card_key, card_bytes)
+
+        return card_bytes
+
+    def draw_sizes_colors_table(self, draw, sizes_colors_data, canvas_width, canvas_height):
+        """Dibujar tabla de talles y colores en la parte superior"""
+        if not sizes_colors_data or not sizes_colors_data.get('sizes') or not sizes_colors_data.get('colors'):
+            print("ℹ️ No hay datos de talles/colores para mostrar")
+            return 0
+
+        try:
+            stock = StockMatrix.from_dict(sizes_colors_data)
+            sizes = stock.sizes
+            colors = stock.colors
+
+            print(f"📊 Dibujando tabla: {len(colors)} colores x {len(sizes)} talles")
+
+            # Configuración de la tabla
+            table_top = 20
+            row_height = 30
+            col_width = 80
+            color_col_width = 150
+
+            # Calcular ancho total de la tabla
+            table_width = color_col_width + (len(sizes) * col_width)
+
+            # Centrar la tabla horizontalmente
+            table_left = (canvas_width - table_width) // 2
+
+            # Fuentes
+            header_font = load_font(14) or default_font()
+            cell_font = load_font(12) or default_font()
+
+            # Dibujar fondo de la tabla
+            table_height = (len(colors) + 1) * row_height
+            draw.rectangle([table_left, table_top, table_left + table_width, table_top + table_height],
+                           fill='#f8f9fa', outline='#dee2e6')
+
+            # Dibujar encabezados de talles
+            for i, size in enumerate(sizes):
+                x = table_left + color_col_width + (i * col_width)
+                y = table_top
+
+                # Celda del encabezado
+                draw.rectangle([x, y, x + col_width, y + row_height], fill='#343a40', outline='#dee2e6')
+
+                # Texto del talle
+                draw.text((x + col_width / 2, y + row_height / 2), str(size),
+                          fill='white', font=header_font, anchor="mm")
+
+            # Dibujar encabezado de colores
+            draw.rectangle([table_left, table_top, table_left + color_col_width, table_top + row_height],
+                           fill='#343a40', outline='#dee2e6')
+            draw.text((table_left + color_col_width / 2, table_top + row_height / 2), "COLORES",
+                      fill='white', font=header_font, anchor="mm")
+
+            # Dibujar filas de colores
+            for row_idx, color in enumerate(colors):
+                y = table_top + (row_idx + 1) * row_height
+
+                # Celda del color
+                draw.rectangle([table_left, y, table_left + color_col_width, y + row_height],
+                               fill='#e9ecef', outline='#dee2e6')
+
+                # Texto del color (truncar si es muy largo)
+                color_display = color[:18] + "..." if len(color) > 18 else color
+                draw.text((table_left + 5, y + row_height / 2), color_display,
+                          fill='black', font=cell_font, anchor="lm")
+
+                # Celdas de disponibilidad por talle
+                for col_idx, size in enumerate(sizes):
+                    x = table_left + color_col_width + (col_idx * col_width)
+
+                    # Verificar disponibilidad
+                    is_available = stock.is_available(row_idx, col_idx)
+                    cell_color = '#d4edda' if is_available else '#f8d7da'
+                    text_color = '#155724' if is_available else '#721c24'
+                    symbol = '✓' if is_available else '✗'
+
+                    draw.rectangle([x, y, x + col_width, y + row_height],
+                                   fill=cell_color, outline='#dee2e6')
+                    draw.text((x + col_width / 2, y + row_height / 2), symbol,
+                              fill=text_color, font=cell_font, anchor="mm")
+
+            print(f"✅ Tabla dibujada: {table_height}px de altura")
+            return table_height + 10  # Altura total + margen
+
+        except Exception as e:
+            print(f"❌ Error dibujando tabla: {e}")
+            return 0
+
+    def calculate_layout(self, img_width, img_height, sizes_colors_data=None):
+        """Calcular layout dinámico considerando la tabla"""
+        # Altura base adicional para la tabla
+        table_height = 0
+        if sizes_colors_data and sizes_colors_data.get('sizes') and sizes_colors_data.get('colors'):
+            num_rows = len(sizes_colors_data['colors']) + 1  # +1 para el encabezado
+            table_height = num_rows * 35 + 50  # Estimación de altura
+
+        # Determinar el tamaño del canvas
+        if img_width > 800 or img_height > 600:
+            canvas_width = max(800, img_width + 100)
+            canvas_height = max(600 + table_height, img_height + 200 + table_height)
+        elif img_width < 300 or img_height < 300:
+            canvas_width = 800
+            canvas_height = 600 + table_height
+        else:
+            canvas_width = img_width + 100
+            canvas_height = img_height + 200 + table_height
+
+        # Calcular tamaño y posición del producto
+        if img_width > canvas_width - 100 or img_height > canvas_height - 200 - table_height:
+            max_product_width = canvas_width - 100
+            max_product_height = canvas_height - 200 - table_height
+
+            ratio = min(max_product_width / img_width, max_product_height / img_height)
+            product_width = int(img_width * ratio)
+            product_height = int(img_height * ratio)
+        else:
+            product_width = min(img_width, canvas_width - 100)
+            product_height = min(img_height, canvas_height - 200 - table_height)
+
+        # Centrar la imagen horizontalmente
+        x_position = (canvas_width - product_width) // 2
+        y_position = 50  # Margen superior base (se ajustará con table_height)
+
+        print(f"📏 Canvas: {canvas_width}x{canvas_height}, Producto: {product_width}x{product_height}")
+        print(f"📍 Posición: ({x_position}, {y_position})")
+
+        return canvas_width, canvas_height, (product_width, product_height), (x_position, y_position)
+
+    def resize_product_image(self, image, target_size):
+        """Redimensionar imagen manteniendo relación de aspecto"""
+        width, height = target_size
+
+        # Mantener relación de aspecto
+        original_width, original_height = image.size
+        ratio = min(width / original_width, height / original_height)
+
+        new_width = int(original_width * ratio)
+        new_height = int(original_height * ratio)
+
+        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    def get_product_image(self, image_url):
+        """Obtener imagen del producto"""
+        if image_url:
+            try:
+                store_key = f"photo:{image_url}"
+                cached = self.store.get(store_key) if self.store else None
+                if cached is not None:
+                    image = Image.open(io.BytesIO(cached))
+                    print(f"💾 Imagen desde almacén persistente: {image.size}")
+                    return image
+
+                print(f"📥 Descargando imagen: {image_url}")
+                if self.scheduler:
+                    with self.scheduler.slot(image_url):
+                        response = self.session.get(image_url, timeout=15)
+                else:
+                    response = self.session.get(image_url, timeout=15)
+                response.raise_for_status()
+
+                # Verificar que sea una imagen
+                content_type = response.headers.get('content-type', '')
+                if 'image' not in content_type:
+                    print(f"❌ URL no es una imagen: {content_type}")
+                    return self.create_placeholder()
+
+                if self.store:
+                    self.store.put(store_key, response.content)
+
+                image = Image.open(io.BytesIO(response.content))
+                print(f"✅ Imagen descargada correctamente: {image.size}")
+                return image
+
+            except Exception as e:
+                print(f"❌ Error descargando imagen: {e}")
+
+        return self.create_placeholder()
+
+    def create_placeholder(self):
+        """Crear imagen placeholder de tamaño estándar"""
+        placeholder = Image.new('RGB', (400, 400), color='lightgray')
+        draw = ImageDraw.Draw(placeholder)
+
+        font = load_font(20) or default_font()
+
+        draw.text((200, 200), "Imagen no disponible", fill='darkgray', font=font, anchor="mm")
+        return placeholder
+
+    def load_fonts(self, canvas_width, product_name):
+        """Cargar fuentes con título dinámico y precio fijo grande"""
+        try:
+            # TAMAÑO FIJO GRANDE para el precio (siempre igual)
+            price_font_size = 52
+            table_font_size = 14
+
+            # TAMAÑO DINÁMICO para el título (se ajusta según longitud)
+            name_length = len(product_name)
+
+            if name_length > 60:
+                title_font_size = 24  # Más pequeño para nombres muy largos
+            elif name_length > 40:
+                title_font_size = 28  # Mediano para nombres largos
+            elif name_length > 25:
+                title_font_size = 32  # Normal para nombres medianos
+            else:
+                title_font_size = 36  # Grande para nombres cortos
+
+            # Intentar cargar fuentes (la resolución queda cacheada por tamaño)
+            title_font = load_font(title_font_size, FONT_PATHS)
+
+            if title_font:
+                print(f"✅ Fuente cargada: {title_font.path}")
+                price_font = load_font(price_font_size, FONT_PATHS)
+                table_font = load_font(table_font_size, FONT_PATHS)
+            else:
+                # Fuentes por defecto con ajustes de tamaño
+                print("⚠️  Usando fuentes por defecto")
+                title_font = default_font()
+                price_font = default_font()
+                table_font = default_font()
+                # Ajustar tamaños para fuentes por defecto
+                if name_length > 60:
+                    title_font_size = 30
+                elif name_length > 40:
+                    title_font_size = 35
+                elif name_length > 25:
+                    title_font_size = 40
+                else:
+                    title_font_size = 45
+                price_font_size = 65
+
+            print(f"🎯 Tamaños - Título: {title_font_size}px ({name_length} chars), Precio: {price_font_size}px")
+
+        except Exception as e:
+            print(f"❌ Error cargando fuentes: {e}")
+            title_font = default_font()
+            price_font = default_font()
+            table_font = default_font()
+
+        return title_font, price_font, table_font
+
+    def calculate_price(self, original_price, formula):
+        """Calcular precio con fórmula y redondeo inteligente"""
+        try:
+            expression = formula.replace('x', str(original_price))
+            result = eval(expression)
+            print(f"🧮 Fórmula aplicada: {formula} = {result}")
+
+            # Aplicar redondeo inteligente basado en el precio
+            result = self.smart_round_price(result, formula)
+
+            return result
+
+        except Exception as e:
+            print(f"❌ Error en fórmula, usando valor por defecto: {e}")
+            return self.smart_round_price(original_price * 1.55, "x * 1.55")
+
+    def smart_round_price(self, price, formula):
+        """
+        Redondeo inteligente basado en el precio y la fórmula
+        """
+        print(f"💰 Precio antes de redondeo: {price}")
+
+        # Detectar si es un recargo del 55%
+        is_55_percent = any(trigger in formula for trigger in ['1.55', '0.55', '55%'])
+
+        if is_55_percent:
+            # Para recargo del 55%, usar múltiplo de 500
+            multiple = 500
+            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
+            print(f"🎯 Recargo 55% detectado - Redondeando a múltiplo de {multiple}: {rounded_price}")
+
+        elif price > 50000:
+            # Precios altos: múltiplo de 1000
+            multiple = 1000
+            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
+            print(f"📈 Precio alto - Redondeando a múltiplo de {multiple}: {rounded_price}")
+
+        elif price > 10000:
+            # Precios medios: múltiplo de 500
+            multiple = 500
+            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
+            print(f"⚖️ Precio medio - Redondeando a múltiplo de {multiple}: {rounded_price}")
+
+        else:
+            # Precios bajos: múltiplo de 100
+            multiple = 100
+            rounded_price = self.round_to_nearest(price, multiple, round_up=True)
+            print(f"📉 Precio bajo - Redondeando a múltiplo de {multiple}: {rounded_price}")
+
+        return rounded_price
+
+    def round_to_nearest(self, number, multiple=500, round_up=True):
+        """
+        Redondear un número al múltiplo más cercano
+        """
+        if multiple == 0:
+            return number
+
+        if round_up:
+            # Redondear siempre hacia arriba
+            rounded = math.ceil(number / multiple) * multiple
+        else:
+            # Redondear al múltiplo más cercano
+            rounded = round(number / multiple) * multiple
+
+        print(f"🔢 Redondeo: {number:.2f} → {rounded:.2f} (múltiplo de {multiple})")
+        return rounded
+
+    def draw_texts(self, draw, name, price, title_font, price_font,
+                   canvas_width, canvas_height, product_position, product_size):
+        """Dibujar textos con mejor espaciado para múltiples líneas"""
+        product_x, product_y = product_position
+        product_width, product_height = product_size
+
+        # Calcular posición Y para los textos
+        text_start_y = product_y + product_height + 35
+
+        # Dividir el nombre en líneas
+        wrapped_lines = self.wrap_text(name, title_font, canvas_width - 100)
+
+        # Dibujar nombre del producto
+        if isinstance(wrapped_lines, list):
+            # Texto multilínea
+            line_height = 38  # Espacio entre líneas
+            total_text_height = len(wrapped_lines) * line_height
+
+            for i, line in enumerate(wrapped_lines):
+                y_position = text_start_y + (i * line_height)
+                draw.text((canvas_width // 2, y_position), line,
+                          fill='black', font=title_font, anchor="mm")
+
+            # Posición del precio
+            price_y = text_start_y + total_text_height + 30
+        else:
+            # Texto de una línea
+            draw.text((canvas_width // 2, text_start_y), wrapped_lines,
+                      fill='black', font=title_font, anchor="mm")
+            price_y = text_start_y + 65
+
+        # Dibujar precio (SIEMPRE GRANDE)
+        price_text = f"${price:.2f}"
+        draw.text((canvas_width // 2, price_y), price_text,
+                  fill='red', font=price_font, anchor="mm")
+
+    def wrap_text(self, text, font, max_width):
+        """Versión definitiva - Divide por palabras respetando límites"""
+        # Limpiar texto de espacios extras
+        text = ' '.join(text.split())
+
+        # Si el texto es corto, devolver como está
+        if len(text) <= 22:
+            return text
+
+        # Límite de caracteres por línea (ajustado para mayúsculas)
+        base_chars_per_line = 22
+        uppercase_count = sum(1 for c in text if c.isupper())
+        total_chars = len(text)
+
+        if uppercase_count / total_chars > 0.6:  # Muchas mayúsculas
+            chars_per_line = 18
+        elif uppercase_count / total_chars > 0.4:  # Bastantes mayúsculas
+            chars_per_line = 20
+        else:  # Texto normal
+            chars_per_line = base_chars_per_line
+
+        words = text.split()
+        lines = []
+        current_line = []
+        current_length = 0
+
+        for word in words:
+            word_len = len(word)
+            space_len = 1 if current_line else 0  # Espacio si no es primera palabra
+
+            # Si agregar esta palabra excede el límite
+            if current_length + word_len + space_len > chars_per_line:
+                if current_line:
+                    # Guardar línea actual
+                    lines.append(' '.join(current_line))
+                    current_line = []
+                    current_length = 0
+
+                # Si ya tenemos 2 líneas, manejar la tercera especial
+                if len(lines) >= 2:
+                    # Para la tercera línea, truncar lo que queda
+                    remaining_words = ' '.join([word] + words[words.index(word) + 1:])
+                    if len(remaining_words) > chars_per_line - 3:
+                        # Buscar punto de corte natural
+                        if ' ' in remaining_words[:chars_per_line - 3]:
+                            cut_point = remaining_words[:chars_per_line - 3].rfind(' ')
+                            if cut_point > 10:  # Asegurar que queda algo legible
+                                lines.append(remaining_words[:cut_point] + "...")
+                            else:
+                                lines.append(remaining_words[:chars_per_line - 6] + "...")
+                        else:
+                            lines.append(remaining_words[:chars_per_line - 6] + "...")
+                    else:
+                        lines.append(remaining_words)
+                    break
+
+            # Agregar palabra a línea actual
+            current_line.append(word)
+            current_length += word_len + space_len
+
+        # Agregar última línea si no llegamos al límite
+        if current_line and len(lines) < 3:
+            lines.append(' '.join(current_line))
+
+        # Devolver resultado
+        if len(lines) == 1:
+            return lines[0]
+        elif len(lines) == 2:
+            return lines
+        else:  # 3 líneas
+            return lines
+
+
+# Instancias globales (el almacén persistente solo se activa con STORE_DIR)
+store = PersistentStore.from_env()
+scheduler = RequestScheduler.from_env()
+scraper = PaulinaScraper(store, scheduler)
+image_gen = ImageGenerator(store, scheduler, scraper.session)
@@ -0,0 +1,44 @@
+"""
+Configuración de gunicorn.
+
+La app se importa y se precalienta una sola vez en el master (preload_app) y
+recién después se hace el fork de los workers: fuentes, módulos y el primer
+render quedan en memoria compartida (copy-on-write) y el primer pedido de cada
+worker no paga el arranque en frío.
+
+Workers, hilos y puerto siguen saliendo de WEB_CONCURRENCY, --threads y PORT.
+Los límites de UPSTREAM_RATE, UPSTREAM_BURST y UPSTREAM_MAX_INFLIGHT son el
+total hacia la tienda: se dividen por la cantidad de workers antes del fork.
+El carril interactivo del planificador solo adelanta pedidos dentro de un
+mismo proceso, así que hace falta --threads (workers gthread) para que un
+pedido interactivo pase delante de un lote en curso.
+
+Con el timeout de los workers se fija cuánto puede esperar un pedido web a la
+tienda; collage y consulta de stock limitan la cantidad de productos para
+terminar dentro de ese tiempo (las colecciones grandes van por collage.py).
+"""
+import gc
+
+preload_app = True
+
+# Mismo valor que el default de gunicorn, explícito porque de él salen los topes
+# de productos por pedido; --timeout o GUNICORN_CMD_ARGS lo siguen pisando
+timeout = 30
+
+
+def on_starting(server):
+    from app import app, warmup
+
+    warmup()
+
+    # Margen para renderizar y enviar la respuesta después del último pedido a la tienda
+    app.config['REQUEST_BUDGET_SECONDS'] = max(1, server.cfg.timeout - 5)
+
+    # Cada worker hereda su parte del presupuesto hacia la tienda
+    from core import scheduler
+
+    scheduler.split_between(server.cfg.workers)
+
+    # Mover lo creado hasta acá fuera del GC: así el GC de cada worker no toca
+    # (ni copia) las páginas compartidas con el master
+    gc.freeze()
@@ -0,0 +1,395 @@
+"""
+Prueba de carga de la app con una tienda falsa local.
+
+Levanta un servidor que imita las páginas de producto de la tienda (inputs
+`descripcion`/`precio`, galería `.tz-gallery` y tabla de talles/colores),
+arranca la app con gunicorn (workers sync y/o gthread) y le envía pedidos
+a `/generate-image` con concurrencia creciente.
+
+Uso:
+    python loadtest.py --modes sync gthread --concurrency 1 2 4 8 16 --duration 15
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FAKE_SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+FAKE_COLORS = ['Negro', 'Blanco', 'Rojo', 'Azul', 'Verde', 'Gris', 'Beige', 'Rosa']
+
+
+class FakeStoreHandler(BaseHTTPRequestHandler):
+    """Responde páginas de producto e imágenes con la forma de la tienda real"""
+
+    def do_GET(self):
+        config = self.server.config
+
+        if config['latency'] > 0:
+            time.sleep(random.uniform(0.5, 1.5) * config['latency'])
+
+        if random.random() < config['error_rate']:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        parsed = urllib.parse.urlparse(self.path)
+        parts = parsed.path.strip('/').split('/')
+        product_id = urllib.parse.parse_qs(parsed.query).get('id', [''])[0]
+
+        if parts == ['productoparticular.php'] and product_id:
+            body = self.server.product_page(product_id).encode('utf-8')
+            content_type = 'text/html; charset=utf-8'
+        elif len(parts) == 3 and parts[:2] == ['uploads', 'products']:
+            body = self.server.product_photo()
+            content_type = 'image/jpeg'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, latency=0.05, error_rate=0.0, image_size=(800, 800), out_of_stock=0.0):
+        super().__init__(('127.0.0.1', port), FakeStoreHandler)
+        self.config = {'latency': latency, 'error_rate': error_rate}
+        self.out_of_stock = out_of_stock
+        self.image_size = image_size
+        self.photo_bytes = None
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def product_page(self, product_id):
+        """HTML de producto determinístico a partir del id.
+
+        Sigue la forma de las páginas de la tienda: inputs ocultos `descripcion`
+        y `precio`, foto principal en `.tz-gallery .col-md-12` y una tabla con
+        los talles en el thead y, por fila, un único <span> con el color seguido
+        de un input de cantidad por talle. Con `out_of_stock` > 0 algunas celdas
+        llevan el input deshabilitado.
+        """
+        rng = random.Random(product_id)
+        name = f"REMERA MODAL {product_id.upper()} ESTAMPADA"
+        price = rng.randint(50, 400) * 100
+        sizes = FAKE_SIZES[:rng.randint(1, len(FAKE_SIZES))]
+        colors = rng.sample(FAKE_COLORS, rng.randint(1, 6))
+        photo = f"uploads/products/{product_id}.jpg"
+
+        header = ''.join(f'<th>{size}</th>' for size in sizes)
+        rows = []
+        for color in colors:
+            cells = []
+            for size in sizes:
+                disabled = ' disabled' if rng.random() < self.out_of_stock else ''
+                cells.append(f'<td><input type="number" class="form-control" '
+                             f'name="cantidad[{color}][{size}]" min="0" value="0"{disabled}></td>')
+            rows.append(f'<tr><td><span>{color}</span></td>{"".join(cells)}</tr>')
+
+        return f"""<!DOCTYPE html>
+<html><head><title>{name}</title></head>
+<body>
+<div class="container">
+  <h3>{name}</h3>
+  <p class="title">Precio mayorista: <strong>${price:.2f}</strong></p>
+  <div class="tz-gallery"><div class="row">
+    <div class="col-sm-12 col-md-12">
+      <a class="lightbox" href="{photo}"><img class="img-responsive" src="{photo}"></a>
+    </div>
+    <div class="col-sm-3"><img src="uploads/products/thumb_{product_id}.jpg"></div>
+  </div></div>
+  <form method="post" action="/carrito">
+    <input type="hidden" name="descripcion" value="{name}">
+    <input type="hidden" name="precio" value="{price}">
+    <table class="table">
+      <thead><tr><th></th>{header}</tr></thead>
+      <tbody>{''.join(rows)}</tbody>
+    </table>
+  </form>
+</div>
+</body></html>"""
+
+    def product_photo(self):
+        """JPEG del tamaño configurado (se genera una sola vez)"""
+        with self.lock:
+            if self.photo_bytes is None:
+                from PIL import Image, ImageDraw
+
+                image = Image.new('RGB', self.image_size, color='#c8d6e5')
+                draw = ImageDraw.Draw(image)
+                width, height = self.image_size
+                for i in range(0, width, 40):
+                    draw.line([(i, 0), (width - i, height)], fill='#576574', width=3)
+
+                img_io = io.BytesIO()
+                image.save(img_io, 'JPEG', quality=90)
+                self.photo_bytes = img_io.getvalue()
+            return self.photo_bytes
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_gunicorn(port, mode, workers, threads, env):
+    """Arrancar la app con gunicorn en el modo indicado (sync o gthread)"""
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:app',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--worker-class', mode,
+        '--timeout', '120'
+    ]
+    if mode == 'gthread':
+        command += ['--threads', str(threads)]
+
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(port) or not wait_for_workers(process.pid, workers):
+        process.terminate()
+        raise RuntimeError("gunicorn no arrancó a tiempo")
+    return process
+
+
+def wait_for_workers(master_pid, workers, timeout=60):
+    """Esperar a que estén todos los workers (con preload arrancan después del warmup)"""
+    if not os.path.isdir('/proc'):
+        return True
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(worker_pids(master_pid)) >= workers:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def worker_pids(master_pid):
+    """PIDs de los workers de gunicorn (hijos del master), leyendo /proc"""
+    pids = []
+    if not os.path.isdir('/proc'):
+        return pids
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            if int(fields[1]) == master_pid:
+                pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return sorted(pids)
+
+
+def process_usage(pid):
+    """Tiempo de CPU acumulado (segundos) y RSS (MB) de un proceso"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+
+        rss_mb = 0.0
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_mb = int(line.split()[1]) / 1024
+                    break
+        return cpu_seconds, rss_mb
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Método nearest-rank: el menor valor con al menos pct% de las muestras a su izquierda
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def send_request(app_url, product_url, with_download):
+    """Un pedido a /generate-image (y opcionalmente la descarga); devuelve (ok, segundos)"""
+    start = time.perf_counter()
+    try:
+        payload = json.dumps({'url': product_url, 'formula': 'x * 1.55'}).encode()
+        req = urllib.request.Request(f'{app_url}/generate-image', data=payload,
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=120) as response:
+            data = json.loads(response.read())
+
+        ok = bool(data.get('success'))
+        if ok and with_download:
+            with urllib.request.urlopen(app_url + data['image_url'], timeout=120) as response:
+                ok = response.status == 200 and len(response.read()) > 0
+
+        return ok, time.perf_counter() - start
+    except (urllib.error.URLError, OSError, ValueError):
+        return False, time.perf_counter() - start
+
+
+def run_step(app_url, store_url, concurrency, duration, with_download, master_pid):
+    """Mantener `concurrency` pedidos en vuelo durante `duration` segundos"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    counter = iter(range(10 ** 9))
+
+    pids = worker_pids(master_pid)
+    usage_before = {pid: process_usage(pid) for pid in pids}
+    step_start = time.time()
+
+    def client():
+        nonlocal errors
+        while time.time() < deadline:
+            with lock:
+                product_id = str(next(counter))
+            product_url = f"{store_url}/productoparticular.php?id={product_id}"
+            ok, elapsed = send_request(app_url, product_url, with_download)
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+
+    elapsed = time.time() - step_start
+    workers = []
+    for pid in pids:
+        cpu_before, _ = usage_before[pid]
+        cpu_after, rss_mb = process_usage(pid)
+        if cpu_before is None or cpu_after is None:
+            continue
+        workers.append({
+            'pid': pid,
+            'cpu_percent': round(100 * (cpu_after - cpu_before) / elapsed, 1),
+            'rss_mb': round(rss_mb, 1)
+        })
+
+    total = len(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'throughput': round(total / elapsed, 2),
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'p50': round(percentile(latencies, 50), 3),
+        'p90': round(percentile(latencies, 90), 3),
+        'p99': round(percentile(latencies, 99), 3),
+        'max': round(max(latencies), 3) if latencies else 0.0,
+        'workers': workers
+    }
+
+
+def print_step(result):
+    print(f"  c={result['concurrency']:<4} req={result['requests']:<6} "
+          f"rps={result['throughput']:<7} err={result['error_rate'] * 100:5.1f}% "
+          f"p50={result['p50']:.3f}s p90={result['p90']:.3f}s p99={result['p99']:.3f}s "
+          f"max={result['max']:.3f}s")
+    for worker in result['workers']:
+        print(f"      worker {worker['pid']}: CPU {worker['cpu_percent']}% RSS {worker['rss_mb']}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga con tienda falsa local')
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gthread'], choices=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='hilos por worker en modo gthread')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=15, help='segundos por escalón')
+    parser.add_argument('--latency', type=float, default=0.05, help='latencia media de la tienda (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fracción de respuestas 503')
+    parser.add_argument('--out-of-stock', type=float, default=0.2,
+                        help='fracción de combinaciones talle/color sin stock')
+    parser.add_argument('--image-size', default='800x800', help='tamaño de las fotos, ej. 1200x1600')
+    parser.add_argument('--with-download', action='store_true', help='pedir también /download/<id>')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+
+    store_server = FakeStoreServer(free_port(), latency=args.latency,
+                                   error_rate=args.error_rate, image_size=(width, height),
+                                   out_of_stock=args.out_of_stock)
+    threading.Thread(target=store_server.serve_forever, daemon=True).start()
+    print(f"🏪 Tienda falsa en {store_server.base_url} "
+          f"(latencia {args.latency}s, errores {args.error_rate * 100:.0f}%, fotos {width}x{height})")
+
+    # Medimos la app, no el planificador: límites altos hacia la tienda local
+    env = dict(os.environ)
+    env.setdefault('UPSTREAM_RATE', '1000')
+    env.setdefault('UPSTREAM_BURST', '1000')
+    env.setdefault('UPSTREAM_MAX_INFLIGHT', '1000')
+
+    results = {}
+    try:
+        for mode in args.modes:
+            port = free_port()
+            print(f"🚀 gunicorn {mode}: {args.workers} workers"
+                  + (f" x {args.threads} hilos" if mode == 'gthread' else ''))
+            process = start_gunicorn(port, mode, args.workers, args.threads, env)
+            try:
+                results[mode] = []
+                for concurrency in args.concurrency:
+                    result = run_step(f'http://127.0.0.1:{port}', store_server.base_url,
+                                      concurrency, args.duration, args.with_download, process.pid)
+                    results[mode].append(result)
+                    print_step(result)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+    finally:
+        store_server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Collage en PDF con scraper y tarjetas de prueba (sin red)."""
+import io
+import os
+import sys
+import tempfile
+
+from PIL import Image, PdfParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collage import CollageRenderer  # noqa: E402
+
+
+class StubScraper:
+    def scrape_product(self, url):
+        if url.endswith('/roto'):
+            return {'error': 'No se pudo acceder a la página'}
+        return {'name': url.rsplit('/', 1)[-1], 'price': 1000.0}
+
+
+class StubImageGenerator:
+    def __init__(self):
+        self.cards = 0
+
+    def get_card_bytes(self, product_data, formula):
+        self.cards += 1
+        buffer = io.BytesIO()
+        Image.new('RGB', (500, 720), color='navy').save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+
+class RecordingRenderer(CollageRenderer):
+    """Anota cuántas tarjetas se habían generado al escribir cada página"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cards_at_page = []
+
+    def write_pdf_page(self, page, output, pages_written):
+        self.cards_at_page.append(self.image_gen.cards)
+        super().write_pdf_page(page, output, pages_written)
+
+
+def test_pdf_has_one_page_per_grid_and_streams_the_pages():
+    image_gen = StubImageGenerator()
+    renderer = RecordingRenderer(StubScraper(), image_gen)
+    urls = [f"https://tienda.example/p/{i}" for i in range(23)] + ['https://tienda.example/roto']
+
+    with tempfile.TemporaryFile() as output:
+        pages = renderer.render(urls, output, columns=3, rows_per_page=2, cell_width=120, workers=2)
+        output.seek(0)
+        pdf = PdfParser.PdfParser(f=output)
+        assert pages == 4
+        assert len(pdf.pages) == 4
+
+    # Cada página se escribe antes de generar las tarjetas de las siguientes
+    # (a lo sumo la ventana de `workers` por delante)
+    for page_index, cards in enumerate(renderer.cards_at_page[:-1]):
+        assert cards <= (page_index + 1) * 6 + 2
+    assert image_gen.cards == 23
+
+
+def test_web_collage_is_capped_to_the_upstream_budget(monkeypatch):
+    from app import app
+    from core import scheduler
+
+    monkeypatch.setitem(app.config, 'REQUEST_BUDGET_SECONDS', 2)
+    limit = scheduler.capacity(2) // 2
+    urls = [f"https://tienda.example/p/{i}" for i in range(limit + 1)]
+
+    response = app.test_client().post('/generate-collage', json={'urls': urls})
+    body = response.get_json()
+    assert body['success'] is False
+    assert f'Máximo {limit} productos' in body['error']
+    assert 'collage.py' in body['error']
@@ -0,0 +1,17 @@
+"""Estadísticas del generador de carga."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import percentile  # noqa: E402
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile(list(range(1, 101)), 50) == 50
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile(list(range(1, 11)), 90) == 9
+    assert percentile(list(range(1, 11)), 100) == 10
+    assert percentile([7], 0) == 7
+    assert percentile([], 50) == 0.0
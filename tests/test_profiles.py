@@ -0,0 +1,69 @@
+"""Perfiles de extracción contra HTML guardado (sin red)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import PAULINA_PROFILE, scraper  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+STORE = 'https://paulinamayorista.com.ar/productoparticular.php?id='
+
+EXPECTED = {
+    'paulina_completo.html': {
+        'name': 'REMERA B',
+        'price': 9999.0,
+        'image_url': 'https://paulinamayorista.com.ar/uploads/products/b.jpg',
+        'sizes_colors': {'sizes': ['S', 'M'], 'colors': ['Negro', 'Blanco'], 'stock': [1, 3]},
+    },
+    'paulina_sin_inputs.html': {
+        'name': 'REMERA A',
+        'price': 1.5,
+        'image_url': 'https://paulinamayorista.com.ar/uploads/products/a_thumb.jpg',
+        'sizes_colors': {'sizes': ['UNICO'], 'colors': ['Rojo'], 'stock': [1]},
+    },
+}
+
+
+def parse_fixture(filename, url):
+    with open(os.path.join(FIXTURES, filename), encoding='utf-8') as f:
+        return scraper.parse_html(f.read(), url)
+
+
+def check(filename, product_id):
+    data = parse_fixture(filename, f"{STORE}{product_id}")
+    for field, expected in EXPECTED[filename].items():
+        assert data[field] == expected, (filename, field, data[field])
+
+
+def test_pages_in_a_row_do_not_leak_between_each_other():
+    # El orden importa: una página sin inputs ocultos no debe cambiar lo que se
+    # extrae de la siguiente
+    for filename, product_id in [
+        ('paulina_completo.html', 1),
+        ('paulina_sin_inputs.html', 2),
+        ('paulina_completo.html', 3),
+        ('paulina_sin_inputs.html', 4),
+        ('paulina_completo.html', 5),
+    ]:
+        check(filename, product_id)
+
+
+def test_unregistered_host_uses_default_cascade():
+    data = parse_fixture('otra_tienda.html', 'https://otra-tienda.example/p/c')
+    assert data['name'] == 'BUZO C'
+    assert data['price'] == 12.5
+    assert data['image_url'] == 'https://otra-tienda.example/uploads/products/c.jpg'
+
+    # Y no altera el resultado para la tienda registrada
+    check('paulina_completo.html', 6)
+
+
+def test_unregistered_hosts_share_one_memory_slot():
+    for i in range(20):
+        parse_fixture('otra_tienda.html', f'https://tienda-{i}.example/p/c')
+    check('paulina_completo.html', 7)
+
+    hosts = {host for host, _, _ in PAULINA_PROFILE.last_strategy}
+    assert None in hosts
+    assert hosts <= {None, 'paulinamayorista.com.ar'}
@@ -0,0 +1,83 @@
+"""Planificador de pedidos: prioridad entre carriles, tiempos de espera y reparto entre workers."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import RequestScheduler  # noqa: E402
+
+HOST = 'tienda.example'
+
+
+def wait_until_queued(scheduler, lane, count):
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        queued = scheduler.stats()['hosts'].get(HOST, {}).get('queued', {})
+        if queued.get(lane) == count:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"{lane} nunca quedó en cola")
+
+
+def test_interactive_waiter_is_served_before_an_earlier_batch_waiter():
+    scheduler = RequestScheduler(rate=1000, burst=10, max_inflight=1, max_wait=5)
+    served = []
+
+    def request(lane):
+        with scheduler.lane(lane):
+            scheduler.acquire(HOST)
+        served.append(lane)
+        scheduler.release(HOST)
+
+    scheduler.acquire(HOST)  # Ocupa el único lugar en vuelo
+
+    batch = threading.Thread(target=request, args=('batch',))
+    batch.start()
+    wait_until_queued(scheduler, 'batch', 1)
+
+    interactive = threading.Thread(target=request, args=('interactive',))
+    interactive.start()
+    wait_until_queued(scheduler, 'interactive', 1)
+
+    scheduler.release(HOST)
+    batch.join(2)
+    interactive.join(2)
+
+    assert served == ['interactive', 'batch']
+
+
+def test_full_host_times_out_and_leaves_the_queue_clean():
+    scheduler = RequestScheduler(rate=1000, burst=10, max_inflight=1, max_wait=0.05)
+    scheduler.acquire(HOST)
+
+    with scheduler.lane('batch'):
+        with pytest.raises(TimeoutError):
+            scheduler.acquire(HOST)
+
+    stats = scheduler.stats()
+    assert stats['lanes']['batch']['timeouts'] == 1
+    assert stats['hosts'][HOST]['queued'] == {'interactive': 0, 'batch': 0}
+    assert stats['hosts'][HOST]['inflight'] == 1
+
+
+def test_exhausted_tokens_time_out():
+    scheduler = RequestScheduler(rate=0.01, burst=1, max_inflight=4, max_wait=0.05)
+    with scheduler.slot(f"https://{HOST}/p/1"):
+        pass
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(HOST)
+    assert scheduler.stats()['lanes']['interactive']['timeouts'] == 1
+
+
+def test_split_between_workers_divides_the_budget():
+    scheduler = RequestScheduler(rate=5, burst=10, max_inflight=4)
+    scheduler.split_between(2)
+    assert (scheduler.rate, scheduler.burst, scheduler.max_inflight) == (2.5, 5, 2)
+
+    scheduler.split_between(8)
+    assert (scheduler.burst, scheduler.max_inflight) == (1, 1)
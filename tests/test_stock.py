@@ -0,0 +1,82 @@
+"""Matriz y catálogo de stock, y celdas de la tabla de la tienda (sin red)."""
+import os
+import sys
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import StockCatalog, StockMatrix, scraper  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture_matrix(filename):
+    with open(os.path.join(FIXTURES, filename), encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    return StockMatrix.from_dict(scraper.extract_sizes_and_colors(soup))
+
+
+def cell(html):
+    return BeautifulSoup(f'<table><tr>{html}</tr></table>', 'html.parser').td
+
+
+def test_disabled_input_marks_the_combination_without_stock():
+    matrix = fixture_matrix('paulina_completo.html')
+    negro, blanco = matrix.colors.index('Negro'), matrix.colors.index('Blanco')
+    s, m = matrix.sizes.index('S'), matrix.sizes.index('M')
+
+    assert matrix.is_available(negro, s)
+    assert not matrix.is_available(negro, m)
+    assert matrix.is_available(blanco, m)
+
+
+def test_cell_in_stock():
+    assert scraper.cell_in_stock(cell('<td><input name="cantidad"></td>'))
+    assert scraper.cell_in_stock(cell('<td></td>'))
+    assert not scraper.cell_in_stock(cell('<td><input name="cantidad" disabled></td>'))
+    assert not scraper.cell_in_stock(cell('<td><input name="cantidad" readonly></td>'))
+    assert not scraper.cell_in_stock(cell('<td><input name="cantidad" max="0"></td>'))
+    assert not scraper.cell_in_stock(cell('<td class="agotado">M</td>'))
+    assert not scraper.cell_in_stock(cell('<td>-</td>'))
+
+
+def test_catalog_queries_across_products():
+    catalog = StockCatalog()
+    catalog.add('remera-b', fixture_matrix('paulina_completo.html'))
+    catalog.add('buzo', StockMatrix(['M', 'L'], ['Rojo', 'Negro'], [0b01, 0b11]))
+
+    # En el orden en que el catálogo conoció cada color
+    assert catalog.colors_with_size('M') == ['Negro', 'Blanco', 'Rojo']
+    assert catalog.colors_with_size('L') == ['Negro']
+    assert catalog.colors_with_size('XXL') == []
+
+    assert sorted(catalog.products_with('M')) == ['buzo', 'remera-b']
+    assert catalog.products_with('M', 'Negro') == ['buzo']
+    assert catalog.products_with('S', 'Negro') == ['remera-b']
+    assert catalog.products_with('M', 'Violeta') == []
+
+    # Reemplazar un producto borra su stock anterior
+    catalog.add('buzo', StockMatrix(['M'], ['Rojo'], [0]))
+    assert catalog.colors_with_size('L') == []
+    assert catalog.products_with('M') == ['remera-b']
+
+
+def test_fixture_without_inputs_keeps_the_single_size_available():
+    catalog = StockCatalog()
+    catalog.add('remera-a', fixture_matrix('paulina_sin_inputs.html'))
+    assert catalog.colors_with_size('UNICO') == ['Rojo']
+
+
+def test_web_stock_query_is_capped_to_the_upstream_budget(monkeypatch):
+    from app import app
+    from core import scheduler
+
+    monkeypatch.setitem(app.config, 'REQUEST_BUDGET_SECONDS', 2)
+    limit = scheduler.capacity(2)
+    urls = [f"https://tienda.example/p/{i}" for i in range(limit + 1)]
+
+    response = app.test_client().post('/stock-query', json={'urls': urls, 'size': 'M'})
+    body = response.get_json()
+    assert body['success'] is False
+    assert f'Máximo {limit} productos' in body['error']
@@ -0,0 +1,103 @@
+"""Almacén persistente: límite compartido entre procesos y escritura a prueba de caídas."""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import PersistentStore  # noqa: E402
+
+KB = 1024
+
+
+def blob_files(store):
+    return sorted(
+        filename
+        for _, _, filenames in os.walk(store.blobs_dir)
+        for filename in filenames
+    )
+
+
+def test_eviction_keeps_the_store_under_the_limit():
+    with tempfile.TemporaryDirectory() as root:
+        store = PersistentStore(root, max_bytes=300 * KB)
+        for i in range(5):
+            store.put(f"k{i}", bytes([i]) * (100 * KB))
+            time.sleep(0.01)
+
+        assert store.total_bytes() <= 300 * KB
+        assert store.get('k0') is None
+        assert store.get('k4') == bytes([4]) * (100 * KB)
+        assert len(blob_files(store)) == 3
+
+
+def test_limit_is_shared_between_workers():
+    # Cada instancia hace de un worker distinto sobre el mismo directorio
+    with tempfile.TemporaryDirectory() as root:
+        workers = [PersistentStore(root, max_bytes=1024 * KB) for _ in range(4)]
+        for i, store in enumerate(workers):
+            store.put(f"k{i}", bytes([i]) * (900 * KB))
+
+        assert workers[0].total_bytes() <= 1024 * KB
+        on_disk = sum(
+            os.path.getsize(os.path.join(dirpath, filename))
+            for dirpath, _, filenames in os.walk(workers[0].blobs_dir)
+            for filename in filenames
+        )
+        assert on_disk <= 1024 * KB
+        assert workers[0].get('k3') == bytes([3]) * (900 * KB)
+
+
+def test_same_content_is_stored_once_and_freed_with_its_last_key():
+    with tempfile.TemporaryDirectory() as root:
+        store = PersistentStore(root)
+        store.put('a', b'igual')
+        store.put('b', b'igual')
+        assert len(blob_files(store)) == 1
+        assert store.total_bytes() == len(b'igual')
+
+        # Reemplazar una clave no borra el blob que sigue usando la otra
+        store.put('a', b'distinto')
+        assert store.get('b') == b'igual'
+        assert store.total_bytes() == len(b'igual') + len(b'distinto')
+
+        store.put('b', b'distinto')
+        assert blob_files(store) == [os.path.basename(store.blob_path(store.index['a']['digest']))]
+        assert store.total_bytes() == len(b'distinto')
+
+
+def test_interrupted_writes_and_orphan_blobs_are_swept_at_load():
+    with tempfile.TemporaryDirectory() as root:
+        store = PersistentStore(root)
+        store.put('vivo', b'contenido')
+        blob_dir = os.path.join(store.blobs_dir, 'ab')
+        os.makedirs(blob_dir, exist_ok=True)
+
+        # Temporal de una escritura cortada, blob viejo sin entrada y blob recién
+        # escrito por otro worker que todavía no confirmó
+        leftover = os.path.join(blob_dir, '.tmp-cortado')
+        orphan = os.path.join(blob_dir, 'ab' + '0' * 62)
+        recent = os.path.join(blob_dir, 'ab' + '1' * 62)
+        for path in (leftover, orphan, recent):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        old = time.time() - 120
+        os.utime(orphan, (old, old))
+
+        reloaded = PersistentStore(root)
+        assert not os.path.exists(leftover)
+        assert not os.path.exists(orphan)
+        assert os.path.exists(recent)
+        assert reloaded.get('vivo') == b'contenido'
+
+
+def test_failed_write_leaves_no_temporary_file():
+    with tempfile.TemporaryDirectory() as root:
+        store = PersistentStore(root)
+        store.max_bytes = None  # Fuerza un error dentro de la transacción
+        store.put('k', b'datos')
+
+        assert blob_files(store) == []
+        assert store.get('k') is None
+        assert store.total_bytes() == 0